@@ -0,0 +1,130 @@
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+
+AGE_BINS = [0, 30, 50, 65, 100]
+AGE_LABELS = ['<30', '30-50', '50-65', '65+']
+
+
+def to_number(series):
+    """Parses money/count columns such as '$150,000' or '3,500'; unparseable values become NaN."""
+    if series.dtype.kind in 'biuf':
+        return series.astype(float)
+    return pd.to_numeric(series.astype(str).str.replace('$', '', regex=False).str.replace(',', ''), errors='coerce')
+
+
+def _column(frame, name):
+    return frame[name] if name in frame.columns else pd.Series(np.nan, index=frame.index)
+
+
+def _observed_counts(series):
+    counts = series.value_counts(sort=False)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Drop categories with no rows and count in order of appearance, as for plain strings
+        counts = counts.reindex(series.dropna().unique())
+    return counts.to_dict()
+
+
+class AggregateStore:
+    """
+    Materialized dashboard rollups, built once and updated incrementally on insert.
+
+    Keeps running sums and counts rather than finished means, so adding rows
+    never needs a pass over the existing data. `version` increases on every update.
+    """
+
+    def __init__(self, df):
+        self._lock = threading.Lock()
+        self.version = 0
+        self.total_drugs = 0
+        self.total_cost = 0.0
+        self.total_members = 0
+        self.pmpm_sum = 0.0
+        self.pmpm_count = 0
+        self.age_sum = 0.0
+        self.age_count = 0
+        self.cost_by_class = defaultdict(float)
+        self.class_counts = Counter()
+        self.pmpm_by_state = defaultdict(lambda: [0.0, 0])
+        self.age_distribution = Counter({label: 0 for label in AGE_LABELS})
+        self.te_codes = Counter()
+        self.add(df)
+
+    def with_rows(self, rows):
+        """A copy with `rows` folded in; this store is left as it is for readers still using it."""
+        with self._lock:
+            store = AggregateStore.__new__(AggregateStore)
+            store.__dict__.update(self.__dict__)
+            store._lock = threading.Lock()
+            store.cost_by_class = defaultdict(float, self.cost_by_class)
+            store.class_counts = Counter(self.class_counts)
+            store.pmpm_by_state = defaultdict(
+                lambda: [0.0, 0], {state: list(bucket) for state, bucket in self.pmpm_by_state.items()}
+            )
+            store.age_distribution = Counter(self.age_distribution)
+            store.te_codes = Counter(self.te_codes)
+        store.add(rows)
+        return store
+
+    def add(self, rows):
+        """Folds newly added (cleaned) rows into every rollup."""
+        if rows is None or len(rows) == 0:
+            return self.version
+
+        total_cost = to_number(_column(rows, 'total_drug_cost'))
+        members = to_number(_column(rows, 'member_count'))
+        pmpm = pd.to_numeric(_column(rows, 'pmpm_cost'), errors='coerce')
+        ages = pd.to_numeric(_column(rows, 'avg_age'), errors='coerce')
+        age_bins = pd.cut(ages, bins=AGE_BINS, labels=AGE_LABELS)
+
+        cost_by_class = total_cost.groupby(rows['therapeutic_class'], observed=True).sum()
+        pmpm_by_state = pmpm.groupby(_column(rows, 'state'), observed=True).agg(['sum', 'count'])
+
+        with self._lock:
+            self.total_drugs += len(rows)
+            self.total_cost += float(total_cost.sum())
+            self.total_members += int(members.sum())
+            self.pmpm_sum += float(pmpm.sum())
+            self.pmpm_count += int(pmpm.count())
+            self.age_sum += float(ages.sum())
+            self.age_count += int(ages.count())
+            for t_class, cost in cost_by_class.items():
+                self.cost_by_class[t_class] += float(cost)
+            self.class_counts.update(_observed_counts(rows['therapeutic_class']))
+            for state, (pmpm_total, count) in pmpm_by_state.iterrows():
+                if count:
+                    bucket = self.pmpm_by_state[state]
+                    bucket[0] += float(pmpm_total)
+                    bucket[1] += int(count)
+            self.age_distribution.update(age_bins.value_counts().to_dict())
+            self.te_codes.update(_observed_counts(_column(rows, 'therapeutic_equivalence_code')))
+            self.version += 1
+            return self.version
+
+    def drug_stats(self):
+        with self._lock:
+            return {
+                'total_drugs': self.total_drugs,
+                'total_cost': self.total_cost,
+                'total_members': self.total_members,
+                'avg_pmpm': self.pmpm_sum / self.pmpm_count if self.pmpm_count else 0,
+                'therapeutic_classes': len(self.class_counts),
+                'states_covered': len(self.pmpm_by_state),
+                'avg_age': self.age_sum / self.age_count if self.age_count else 0,
+                'te_codes_distribution': {code: int(n) for code, n in self.te_codes.items()}
+            }
+
+    def therapeutic_classes(self):
+        with self._lock:
+            return [{'name': name, 'count': int(count)} for name, count in self.class_counts.most_common()]
+
+    def cost_analysis(self):
+        with self._lock:
+            return {
+                'cost_by_therapeutic_class': dict(self.cost_by_class),
+                'pmpm_by_state': {state: total / count for state, (total, count) in self.pmpm_by_state.items()},
+                'age_distribution': {label: int(self.age_distribution[label]) for label in AGE_LABELS}
+            }
@@ -1,15 +1,18 @@
 import pandas as pd
 import numpy as np
-import ast
+import os
+import threading
 import warnings
-from itertools import product
 
 # --- ML and NLP Libraries ---
 # You must install these: pip install transformers torch scikit-learn lightgbm
-from transformers import pipeline
-import lightgbm as lgb
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error
+# They are imported where they are used, so importing this module stays fast.
+
+from nlp_cache import VerdictCache, DEFAULT_CACHE_PATH
+from interaction_tier import InteractionTier, DEFAULT_TIER_PATH
+from interaction_index import InteractionIndex
+from drug_catalog import as_catalog
+import metrics
 
 # Suppress pandas warnings for cleaner output
 warnings.filterwarnings('ignore', category=UserWarning, module='pandas')
@@ -17,36 +20,142 @@ warnings.filterwarnings('ignore', category=FutureWarning)
 
 
 # --- NLP MODEL SETUP ---
-print("Loading NLP model... (This may take a moment on first run)")
-try:
-    nlp_classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
-    print("✅ NLP model loaded successfully.")
-except Exception as e:
-    print(f"❌ Could not load NLP model. Error: {e}")
-    nlp_classifier = None
+NLP_MODEL_ID = os.environ.get("NLP_MODEL_ID", "facebook/bart-large-mnli")
+CANDIDATE_LABELS = ["high risk", "low risk"]
+NLP_BATCH_SIZE = int(os.environ.get("NLP_BATCH_SIZE", "16"))
+TRAINING_CHUNK_SIZE = int(os.environ.get("TRAINING_CHUNK_SIZE", "100000"))
+
+# --- MODEL SCHEMA ---
+# Bump SCORING_VERSION whenever the features or the target score change, so saved model artifacts are rebuilt.
+FEATURES = ['is_same_generic', 'is_equivalent', 'cost_difference', 'interaction_risk']
+SCORING_VERSION = "1"
+# Stored as "$150,000" / "3,500" in the CSV; parsed to numbers on load.
+NUMERIC_COLUMNS = ['pmpm_cost', 'total_drug_cost', 'member_count', 'total_prescription_fills']
+
+# The classifier is loaded on first use (or by start_nlp_warmup), never at import time.
+_nlp_classifier = None
+_nlp_state = "idle"  # idle -> loading -> ready | failed
+_nlp_lock = threading.Lock()
+
+
+def get_nlp_classifier():
+    """
+    Returns the zero-shot pipeline, loading it on first call. Thread-safe: concurrent
+    callers wait for a single load. Returns None if the model cannot be loaded.
+    """
+    global _nlp_classifier, _nlp_state
+    if _nlp_state in ("ready", "failed"):
+        return _nlp_classifier
+
+    with _nlp_lock:
+        if _nlp_state in ("ready", "failed"):
+            return _nlp_classifier
+        _nlp_state = "loading"
+        print("Loading NLP model... (This may take a moment on first run)")
+        try:
+            from transformers import pipeline
+            _nlp_classifier = pipeline("zero-shot-classification", model=NLP_MODEL_ID)
+            _nlp_state = "ready"
+            print("✅ NLP model loaded successfully.")
+        except Exception as e:
+            print(f"❌ Could not load NLP model. Error: {e}")
+            _nlp_classifier = None
+            _nlp_state = "failed"
+    return _nlp_classifier
+
+
+def set_nlp_classifier(classifier):
+    """
+    Installs an already-built classifier in place of BART, e.g. a stub so
+    benchmarks run offline. It is called like the zero-shot pipeline.
+    """
+    global _nlp_classifier, _nlp_state
+    with _nlp_lock:
+        _nlp_classifier = classifier
+        _nlp_state = "ready"
+
+
+def start_nlp_warmup():
+    """
+    Loads the NLP model on a background thread so the first request doesn't pay for it.
+    """
+    if _nlp_state != "idle":
+        return None
+    thread = threading.Thread(target=get_nlp_classifier, name="nlp-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def nlp_status():
+    """
+    Returns 'idle' (not requested yet), 'loading', 'ready' or 'degraded' (no NLP).
+    """
+    return "degraded" if _nlp_state == "failed" else _nlp_state
+
+
+# Verdicts are cached by description text; set NLP_CACHE_PATH="" to keep them in memory only.
+verdict_cache = VerdictCache(NLP_MODEL_ID, CANDIDATE_LABELS, path=os.environ.get("NLP_CACHE_PATH", DEFAULT_CACHE_PATH))
+
+# Fast first tier distilled from the zero-shot model (see interaction_tier.py), None if there is none.
+# Set INTERACTION_TIER_PATH="" to send every uncached description to the zero-shot model.
+interaction_tier = InteractionTier.load(
+    os.environ.get("INTERACTION_TIER_PATH", DEFAULT_TIER_PATH), NLP_MODEL_ID, CANDIDATE_LABELS
+)
+
+# Parsed interaction lists and name mentions, rebuilt by load_and_clean_data.
+interaction_index = InteractionIndex()
+
+
+def clean_drug_frame(df):
+    """
+    Normalizes raw drug rows: numeric costs and counts, upper-cased names, default
+    TE code and interaction list, and drops rows missing a required field.
+    Used for the CSV load and for drugs added at runtime.
+    """
+    df.columns = df.columns.str.strip()
+
+    # The source CSV repeats therapeutic_equivalence_code (read as '.1') and ends in empty columns
+    redundant = [
+        col for col in df.columns
+        if (col.endswith('.1') and col[:-2] in df.columns) or (col.startswith('Unnamed:') and df[col].isna().all())
+    ]
+    df.drop(columns=redundant, inplace=True)
+
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns and df[col].dtype.kind not in 'biuf':
+            df[col] = df[col].astype(str).str.replace('$', '', regex=False).str.replace(',', '')
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    for col in ['drug_name', 'generic_name']:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip().str.upper()
+            df[col] = df[col].replace('NAN', np.nan)
+
+    for col, default in [('therapeutic_equivalence_code', 'NA'), ('drug_interactions', '[]')]:
+        df[col] = df[col].fillna(default) if col in df.columns else default
+
+    df.dropna(subset=['drug_name', 'generic_name', 'pmpm_cost', 'therapeutic_class'], inplace=True)
+    return df
 
 
 def load_and_clean_data(filepath):
     """
-    Loads and cleans the initial drug dataset.
+    Loads and cleans the initial drug dataset and indexes its interaction lists.
+    A current columnar copy (see columnar_store.py) is memory-mapped instead of
+    parsing the CSV; `filepath` may also point at a columnar directory directly.
     """
+    global interaction_index
     try:
-        df = pd.read_csv(filepath)
-        df.columns = df.columns.str.strip()
-        
-        if 'pmpm_cost' in df.columns:
-            df['pmpm_cost'] = df['pmpm_cost'].astype(str).str.replace('$', '', regex=False).str.replace(',', '')
-            df['pmpm_cost'] = pd.to_numeric(df['pmpm_cost'], errors='coerce')
-            
-        for col in ['drug_name', 'generic_name']:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.strip().str.upper()
-                df[col].replace('NAN', np.nan, inplace=True)
-
-        df['therapeutic_equivalence_code'].fillna('NA', inplace=True)
-        df['drug_interactions'].fillna('[]', inplace=True)
-        
-        df.dropna(subset=['drug_name', 'generic_name', 'pmpm_cost', 'therapeutic_class'], inplace=True)
+        from columnar_store import find_columnar, load_columnar
+
+        columnar_path = find_columnar(filepath)
+        if columnar_path is not None:
+            df = load_columnar(columnar_path)
+            print(f"ℹ️ Memory-mapped columnar dataset '{columnar_path}'.")
+        else:
+            df = clean_drug_frame(pd.read_csv(filepath))
+
+        interaction_index = InteractionIndex.from_frame(df)
         
         print("✅ Dataset loaded and cleaned successfully.")
         return df
@@ -59,96 +168,238 @@ def load_and_clean_data(filepath):
         return None
 
 
-def check_interaction_nlp(drug1_info, drug2_info):
+def find_interaction_description(drug1_info, drug2_info, interactions=None):
+    """
+    Returns the first interaction description that links the two drugs, or None.
+    `interactions` is the InteractionIndex to search (default: the one built by
+    load_and_clean_data). Raises ValueError/SyntaxError if either drug's
+    interaction data cannot be parsed.
+    """
+    index = interactions if interactions is not None else interaction_index
+    return index.find(drug1_info, drug2_info)
+
+
+def classify_interactions(descriptions, batch_size=NLP_BATCH_SIZE, use_fast_tier=True):
+    """
+    Returns {description: top zero-shot label} for the unique descriptions given.
+    Cached verdicts are reused. The fast tier, if loaded, answers the rest it is
+    confident about; what remains goes through the classifier in mini-batches,
+    which is only loaded then. Descriptions left without a verdict because the
+    classifier is unavailable are missing from the result.
+    """
+    unique_descriptions = list(dict.fromkeys(descriptions))
+    with metrics.timer('nlp_cache'):
+        labels = verdict_cache.get_many(unique_descriptions)
+    misses = [desc for desc in unique_descriptions if desc not in labels]
+
+    tier = interaction_tier if use_fast_tier else None
+    guesses = {}
+    if tier is not None:
+        with metrics.timer('nlp_fast_tier'):
+            # Cached zero-shot verdicts double as a check of the tier's agreement, once per description.
+            cached = tier.unchecked(labels)
+            predicted = tier.predict(cached + misses)
+        tier.record_agreement(dict(zip(cached, (label for label, _ in predicted))), {desc: labels[desc] for desc in cached})
+        escalated = []
+        for desc, (label, confidence) in zip(misses, predicted[len(cached):]):
+            if confidence >= tier.threshold:
+                labels[desc] = label
+            else:
+                guesses[desc] = label
+                escalated.append(desc)
+        tier.record_usage(len(misses) - len(escalated), len(escalated))
+        misses = escalated
+
+    classifier = get_nlp_classifier() if misses else None
+    if classifier is None:
+        return labels
+
+    for start in range(0, len(misses), batch_size):
+        batch = misses[start:start + batch_size]
+        metrics.count('nlp_call')
+        metrics.observe_size('nlp_batch', len(batch))
+        with metrics.timer('nlp_classify'):
+            results = classifier(batch, CANDIDATE_LABELS, batch_size=batch_size)
+        if isinstance(results, dict): results = [results]
+        verdicts = {desc: (result['labels'][0], result['scores'][0]) for desc, result in zip(batch, results)}
+        verdict_cache.put_many(verdicts)
+        batch_labels = {desc: label for desc, (label, _) in verdicts.items()}
+        labels.update(batch_labels)
+        if guesses:
+            tier.record_agreement(guesses, batch_labels)
+
+    return labels
+
+
+def classify_interaction(description):
+    """
+    Returns the top zero-shot label for a single interaction description, or
+    None if it has no verdict and the classifier is unavailable.
+    """
+    return classify_interactions([description]).get(description)
+
+
+def risk_from_label(top_label):
+    return 2 if top_label == "high risk" else 1
+
+
+def check_interaction_nlp(drug1_info, drug2_info, interactions=None):
     """
     Returns a numerical risk score (0 for none, 1 for low, 2 for high).
     """
-    if nlp_classifier is None: return 0, "NLP model not available."
-    
-    interaction_description = None
     try:
-        interactions1_data = drug1_info['drug_interactions']
-        interactions1 = ast.literal_eval(interactions1_data) if isinstance(interactions1_data, str) and interactions1_data.startswith('[') else [str(interactions1_data)]
-        for desc in interactions1:
-            if drug2_info['drug_name'].lower() in desc.lower() or drug2_info['generic_name'].lower() in desc.lower():
-                interaction_description = desc
-                break
-        if not interaction_description:
-            interactions2_data = drug2_info['drug_interactions']
-            interactions2 = ast.literal_eval(interactions2_data) if isinstance(interactions2_data, str) and interactions2_data.startswith('[') else [str(interactions2_data)]
-            for desc in interactions2:
-                if drug1_info['drug_name'].lower() in desc.lower() or drug1_info['generic_name'].lower() in desc.lower():
-                    interaction_description = desc
-                    break
+        with metrics.timer('interaction_lookup'):
+            interaction_description = find_interaction_description(drug1_info, drug2_info, interactions)
     except (ValueError, SyntaxError): return 1, "Could not parse interaction data."
-    
+
     if not interaction_description or pd.isna(interaction_description): return 0, "No interaction found."
 
-    candidate_labels = ["high risk", "low risk"]
-    result = nlp_classifier(interaction_description, candidate_labels)
-    top_label = result['labels'][0]
-    
-    if top_label == "high risk":
-        return 2, interaction_description
-    else:
-        return 1, interaction_description
+    label = classify_interaction(interaction_description)
+    if label is None: return 0, "NLP model not available."
+    return risk_from_label(label), interaction_description
 
-def create_training_data(df):
+
+def score_interaction_risks(pairs, batch_size=NLP_BATCH_SIZE, interactions=None):
+    """
+    Batched NLP stage for many (drug_a, drug_b) pairs.
+
+    Collects the interaction description of every pair, classifies the unique
+    descriptions in mini-batches and scatters the risk scores back onto the pairs.
+    Returns a list of risk scores aligned with `pairs`; pairs whose description
+    got no verdict (classifier unavailable) score 0.
+    """
+    risks = [0] * len(pairs)
+
+    metrics.observe_size('interaction_pairs', len(pairs))
+    pair_descriptions = {}
+    with metrics.timer('interaction_lookup'):
+        for i, (drug_a, drug_b) in enumerate(pairs):
+            try:
+                description = find_interaction_description(drug_a, drug_b, interactions)
+            except (ValueError, SyntaxError):
+                risks[i] = 1
+                continue
+            if description and not pd.isna(description):
+                pair_descriptions[i] = description
+
+    labels = classify_interactions(pair_descriptions.values(), batch_size)
+    metrics.observe_size('interaction_descriptions', len(labels))
+
+    for i, description in pair_descriptions.items():
+        if description in labels:
+            risks[i] = risk_from_label(labels[description])
+    return risks
+
+
+def candidate_interaction_risks(original_drug, candidates, interactions=None):
+    """
+    Interaction risk between a drug and each candidate record replacing it,
+    scored as training pairs are (the original drug first).
+    """
+    pairs = [(original_drug, candidate) for candidate in candidates]
+    return np.asarray(score_interaction_risks(pairs, interactions=interactions), dtype=np.int8)
+
+
+def iter_training_pairs(catalog, chunk_size=TRAINING_CHUNK_SIZE, classes=None):
+    """
+    Yields (a_positions, b_positions) arrays of ordered drug pairs within each
+    therapeutic class, skipping pairs with the same drug name. `classes` limits
+    this to some (class, member positions) entries of catalog.classes().
+
+    Pairs come out in fixed-size chunks (the last one may be shorter) and large
+    classes are expanded block by block, so peak memory is bounded by `chunk_size`.
+    """
+    catalog = as_catalog(catalog)
+    names = catalog.codes['drug_name']
+
+    pending_a, pending_b = np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    for _, members in (catalog.classes() if classes is None else classes):
+        class_size = len(members)
+        rows_per_block = max(1, chunk_size // class_size)
+        for start in range(0, class_size, rows_per_block):
+            block = members[start:start + rows_per_block]
+            a_positions = np.repeat(block, class_size)
+            b_positions = np.tile(members, len(block))
+            keep = names[a_positions] != names[b_positions]
+
+            pending_a = np.concatenate([pending_a, a_positions[keep]])
+            pending_b = np.concatenate([pending_b, b_positions[keep]])
+            while len(pending_a) >= chunk_size:
+                yield pending_a[:chunk_size], pending_b[:chunk_size]
+                pending_a, pending_b = pending_a[chunk_size:], pending_b[chunk_size:]
+
+    if len(pending_a):
+        yield pending_a, pending_b
+
+
+def build_training_chunk(catalog, a_positions, b_positions, batch_size=NLP_BATCH_SIZE, interactions=None):
+    """
+    Computes features and target score for a chunk of pairs as whole-array operations
+    over the catalog's precomputed columns. Only the NLP stage needs full records.
+    """
+    generic_codes = catalog.codes['generic_name']
+
+    is_same_generic = (generic_codes[a_positions] == generic_codes[b_positions]).astype(np.int8)
+    is_equivalent = catalog.is_equivalent[b_positions]
+    cost_difference = catalog.costs[a_positions] - catalog.costs[b_positions]
+    needed = np.unique(np.concatenate([a_positions, b_positions]))
+    records = dict(zip(needed, catalog.records(needed)))
+    pairs = [(records[a], records[b]) for a, b in zip(a_positions, b_positions)]
+    interaction_risk = np.asarray(score_interaction_risks(pairs, batch_size, interactions), dtype=np.int8)
+
+    score = np.where(is_same_generic == 1, 50 + 20 * is_equivalent + np.maximum(0, cost_difference), -1000)
+    score = score - 500 * interaction_risk
+
+    return pd.DataFrame({
+        'drug_a_name': catalog.values('drug_name', a_positions),
+        'drug_b_name': catalog.values('drug_name', b_positions),
+        'is_same_generic': is_same_generic,
+        'is_equivalent': is_equivalent,
+        'cost_difference': cost_difference,
+        'interaction_risk': interaction_risk,
+        'alternative_score': score
+    })
+
+
+def create_training_data(df, batch_size=NLP_BATCH_SIZE, chunk_size=TRAINING_CHUNK_SIZE, workers=None):
     """
     Creates a training dataset where the NLP interaction check is "baked in".
+    `df` is the cleaned dataset or a DrugCatalog over it. Large datasets are
+    built by `workers` processes (default TRAINING_WORKERS), see training_shards.py.
     """
-    print("\nCreating fully integrated training data for the ML model...")
-    
-    pairs = []
-    for t_class in df['therapeutic_class'].unique():
-        drugs_in_class = df[df['therapeutic_class'] == t_class]
-        for drug_a, drug_b in product(drugs_in_class.to_dict('records'), repeat=2):
-            if drug_a['drug_name'] != drug_b['drug_name']:
-                pairs.append((drug_a, drug_b))
-
-    if not pairs:
-        print("❌ Could not generate any drug pairs for training.")
-        return None
+    from training_shards import build_sharded
 
-    training_rows = []
-    for drug_a, drug_b in pairs:
-        is_same_generic = 1 if drug_a['generic_name'] == drug_b['generic_name'] else 0
-        is_equivalent = 1 if drug_b['therapeutic_equivalence_code'] != 'NA' else 0
-        cost_difference = drug_a['pmpm_cost'] - drug_b['pmpm_cost']
-        interaction_risk, _ = check_interaction_nlp(drug_a, drug_b)
-
-        score = 0
-        if is_same_generic:
-            score += 50
-            score += 20 * is_equivalent
-            score += max(0, cost_difference)
-        else:
-            score -= 1000
+    print("\nCreating fully integrated training data for the ML model...")
 
-        score -= 500 * interaction_risk
+    catalog = as_catalog(df)
+    training_df = build_sharded(catalog, batch_size, chunk_size, workers)
+    if training_df is None:
+        chunks = [
+            build_training_chunk(catalog, a_positions, b_positions, batch_size)
+            for a_positions, b_positions in iter_training_pairs(catalog, chunk_size)
+        ]
+        training_df = pd.concat(chunks, ignore_index=True) if chunks else None
 
-        training_rows.append({
-            'drug_a_name': drug_a['drug_name'],
-            'drug_b_name': drug_b['drug_name'],
-            'is_same_generic': is_same_generic,
-            'is_equivalent': is_equivalent,
-            'cost_difference': cost_difference,
-            'interaction_risk': interaction_risk,
-            'alternative_score': score
-        })
+    if training_df is None:
+        print("❌ Could not generate any drug pairs for training.")
+        return None
 
-    training_df = pd.DataFrame(training_rows)
     print(f"✅ Created {len(training_df)} training examples with integrated safety scores.")
     return training_df
 
 
-def train_ml_model(training_df):
+def train_ml_model(training_df, return_metrics=False):
     """
     Trains the ML model on the new, richer feature set.
+    With return_metrics=True, returns (model, validation metrics) instead.
     """
+    import lightgbm as lgb
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import mean_squared_error
+
     print("\nTraining the integrated recommendation model...")
     
-    features = ['is_same_generic', 'is_equivalent', 'cost_difference', 'interaction_risk']
+    features = FEATURES
     target = 'alternative_score'
 
     X = training_df[features]
@@ -162,14 +413,50 @@ def train_ml_model(training_df):
     predictions = lgb_regressor.predict(X_test)
     rmse = np.sqrt(mean_squared_error(y_test, predictions))
     print(f"✅ Model trained. Validation RMSE: {rmse:.2f}")
-    
+
+    if return_metrics:
+        metrics = {'rmse': float(rmse), 'train_rows': len(X_train), 'validation_rows': len(X_test)}
+        return lgb_regressor, metrics
     return lgb_regressor
 
 
-def recommend_with_ml(model, original_drugs, df):
+def candidate_feature_frame(original_drug, candidates):
+    """
+    Builds the per-candidate features for replacing `original_drug`, with no interaction risk.
+    """
+    return pd.DataFrame({
+        'is_same_generic': (candidates['generic_name'].to_numpy() == original_drug['generic_name']).astype(np.int8),
+        'is_equivalent': (candidates['therapeutic_equivalence_code'].to_numpy() != 'NA').astype(np.int8),
+        'cost_difference': original_drug['pmpm_cost'] - candidates['pmpm_cost'].to_numpy(dtype=float),
+        'interaction_risk': np.zeros(len(candidates), dtype=np.int8)
+    })
+
+
+def regimen_slots(original_drugs):
+    """
+    The drugs recommend_with_ml replaces, in the order of its recommendations:
+    more than two records are reduced to the first record of each drug name,
+    in order of first appearance.
+    """
+    if len(original_drugs) <= 2:
+        return list(original_drugs)
+    slots = {}
+    for drug in original_drugs:
+        slots.setdefault(drug['drug_name'], drug)
+    return list(slots.values())
+
+
+def recommend_with_ml(model, original_drugs, df, table=None, interactions=None):
     """
     A single function for all ML recommendations, now with new rules.
+    `df` is a DrugCatalog (a plain DataFrame is indexed on the spot).
+    If a precomputed RecommendationTable is given, single drugs are answered from it.
+    `interactions` is the InteractionIndex matching `df` (default: the loaded one).
+    Regimens of more than two drugs go through the beam-search regimen optimizer.
     """
+    catalog = as_catalog(df)
+    # One slot per drug name; a name listed under several NDCs is replaced once
+    original_drugs = regimen_slots(original_drugs)
     if len(original_drugs) == 1:
         original_drug = original_drugs[0]
         
@@ -177,28 +464,38 @@ def recommend_with_ml(model, original_drugs, df):
             print(f"  - WARNING: The input drug '{original_drug['drug_name']}' has a TE code of 'NA'. No alternative will be recommended.")
             return None
 
-        candidates = df[df['therapeutic_class'] == original_drug['therapeutic_class']]
+        with metrics.timer('table_lookup'):
+            ranked = table.get(original_drug) if table is not None else None
+        if ranked is not None:
+            metrics.count('table_hit')
+            return [ranked[0][0]] if ranked else None
+        metrics.count('table_miss')
+
+        with metrics.timer('candidates'):
+            candidates = catalog.class_positions(original_drug['therapeutic_class'])
+            name_code = catalog.code('drug_name', original_drug['drug_name'])
+            candidates = candidates[catalog.codes['drug_name'][candidates] != name_code]
+        metrics.observe_size('candidates', len(candidates))
         
-        prediction_rows = []
-        for _, candidate in candidates.iterrows():
-            if original_drug['drug_name'] == candidate['drug_name']: continue
-            prediction_rows.append({
-                'is_same_generic': 1 if original_drug['generic_name'] == candidate['generic_name'] else 0,
-                'is_equivalent': 1 if candidate['therapeutic_equivalence_code'] != 'NA' else 0,
-                'cost_difference': original_drug['pmpm_cost'] - candidate['pmpm_cost'],
-                'interaction_risk': 0,
-                'drug_b_name': candidate['drug_name']
-            })
+        if not len(candidates): return None
         
-        if not prediction_rows: return None
-        
-        prediction_df = pd.DataFrame(prediction_rows)
-        features = ['is_same_generic', 'is_equivalent', 'cost_difference', 'interaction_risk']
-        prediction_df['predicted_score'] = model.predict(prediction_df[features])
-        best_alt_name = prediction_df.sort_values('predicted_score', ascending=False).iloc[0]['drug_b_name']
-        return [df[df['drug_name'] == best_alt_name].iloc[0]]
-
-    elif len(original_drugs) >= 2:
+        features = FEATURES
+        with metrics.timer('features'):
+            feature_frame = catalog.feature_frame(original_drug, candidates)
+        feature_frame['interaction_risk'] = candidate_interaction_risks(
+            original_drug, catalog.records(candidates), interactions
+        )
+        with metrics.timer('predict'):
+            predictions = model.predict(feature_frame[features])
+        best_alt_name = catalog.values('drug_name', candidates[[int(np.argmax(predictions))]])[0]
+        return catalog.records(catalog.name_positions([best_alt_name])[:1])
+
+    elif len(original_drugs) > 2:
+        from regimen_optimizer import optimize_regimen
+        regimens = optimize_regimen(model, original_drugs, catalog, top_k=1, interactions=interactions)
+        return regimens[0]['drugs'] if regimens else None
+
+    elif len(original_drugs) == 2:
         drug1_orig, drug2_orig = original_drugs[0], original_drugs[1]
         
         if drug1_orig['generic_name'] == drug2_orig['generic_name'] and drug1_orig['therapeutic_class'] == drug2_orig['therapeutic_class']:
@@ -206,40 +503,55 @@ def recommend_with_ml(model, original_drugs, df):
             return None
 
         # --- NEW RULE: Check TE code for each input drug ---
-        if drug1_orig['therapeutic_equivalence_code'] == 'NA':
-            print(f"  - INFO: Input drug '{drug1_orig['drug_name']}' has TE code 'NA' and will not be replaced.")
-            alts1 = pd.DataFrame([drug1_orig])
-        else:
-            alts1 = df[df['therapeutic_class'] == drug1_orig['therapeutic_class']]
-
-        if drug2_orig['therapeutic_equivalence_code'] == 'NA':
-            print(f"  - INFO: Input drug '{drug2_orig['drug_name']}' has TE code 'NA' and will not be replaced.")
-            alts2 = pd.DataFrame([drug2_orig])
-        else:
-            alts2 = df[df['therapeutic_class'] == drug2_orig['therapeutic_class']]
-
-        candidate_pairs = list(product(alts1.to_dict('records'), alts2.to_dict('records')))
-        
-        prediction_rows = []
-        for alt1, alt2 in candidate_pairs:
-            interaction_risk, _ = check_interaction_nlp(alt1, alt2)
-            score1_features = pd.DataFrame([{'is_same_generic': 1 if drug1_orig['generic_name'] == alt1['generic_name'] else 0, 'is_equivalent': 1 if alt1['therapeutic_equivalence_code'] != 'NA' else 0, 'cost_difference': drug1_orig['pmpm_cost'] - alt1['pmpm_cost'], 'interaction_risk': interaction_risk}])
-            score2_features = pd.DataFrame([{'is_same_generic': 1 if drug2_orig['generic_name'] == alt2['generic_name'] else 0, 'is_equivalent': 1 if alt2['therapeutic_equivalence_code'] != 'NA' else 0, 'cost_difference': drug2_orig['pmpm_cost'] - alt2['pmpm_cost'], 'interaction_risk': interaction_risk}])
-            pred1 = model.predict(score1_features)[0]
-            pred2 = model.predict(score2_features)[0]
-            
-            prediction_rows.append({'alt1': alt1, 'alt2': alt2, 'total_score': pred1 + pred2})
-
-        if not prediction_rows: return None
-        best_pair = max(prediction_rows, key=lambda x: x['total_score'])
-        return [best_pair['alt1'], best_pair['alt2']]
+        with metrics.timer('candidates'):
+            if drug1_orig['therapeutic_equivalence_code'] == 'NA':
+                print(f"  - INFO: Input drug '{drug1_orig['drug_name']}' has TE code 'NA' and will not be replaced.")
+                alts1_records = [drug1_orig]
+                slot1_features = candidate_feature_frame(drug1_orig, pd.DataFrame(alts1_records))
+            else:
+                alts1 = catalog.class_positions(drug1_orig['therapeutic_class'])
+                alts1_records = catalog.records(alts1)
+                slot1_features = catalog.feature_frame(drug1_orig, alts1)
+
+            if drug2_orig['therapeutic_equivalence_code'] == 'NA':
+                print(f"  - INFO: Input drug '{drug2_orig['drug_name']}' has TE code 'NA' and will not be replaced.")
+                alts2_records = [drug2_orig]
+                slot2_features = candidate_feature_frame(drug2_orig, pd.DataFrame(alts2_records))
+            else:
+                alts2 = catalog.class_positions(drug2_orig['therapeutic_class'])
+                alts2_records = catalog.records(alts2)
+                slot2_features = catalog.feature_frame(drug2_orig, alts2)
+        metrics.observe_size('candidates', len(alts1_records) * len(alts2_records))
+
+        if not alts1_records or not alts2_records: return None
+
+        # Pair grid in the same order as product(alts1, alts2).
+        alt1_positions = np.repeat(np.arange(len(alts1_records)), len(alts2_records))
+        alt2_positions = np.tile(np.arange(len(alts2_records)), len(alts1_records))
+        candidate_pairs = [(alts1_records[i], alts2_records[j]) for i, j in zip(alt1_positions, alt2_positions)]
+        interaction_risk = np.asarray(score_interaction_risks(candidate_pairs, interactions=interactions), dtype=np.int8)
+
+        # One feature matrix: the first half scores slot 1 of every pair, the second half slot 2.
+        with metrics.timer('features'):
+            feature_matrix = pd.concat([
+                slot1_features.iloc[alt1_positions].assign(interaction_risk=interaction_risk),
+                slot2_features.iloc[alt2_positions].assign(interaction_risk=interaction_risk)
+            ], ignore_index=True)
+
+        features = FEATURES
+        with metrics.timer('predict'):
+            predictions = model.predict(feature_matrix[features])
+        total_scores = predictions[:len(candidate_pairs)] + predictions[len(candidate_pairs):]
+
+        best = int(np.argmax(total_scores))
+        return [alts1_records[alt1_positions[best]], alts2_records[alt2_positions[best]]]
 
 
 def main():
     """
     Main function to orchestrate the new, fully ML-powered workflow.
     """
-    if nlp_classifier is None: return
+    if get_nlp_classifier() is None: return
 
     filepath = "/content/testtt01.csv"
     df = load_and_clean_data(filepath)
@@ -0,0 +1,185 @@
+import multiprocessing
+import os
+import sys
+from collections import deque
+
+import pandas as pd
+
+from app import recommend_with_ml, regimen_slots
+
+
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", str(os.cpu_count() or 1)))
+# Below this many unique regimens, forking workers costs more than it saves.
+INLINE_THRESHOLD = int(os.environ.get("BATCH_INLINE_THRESHOLD", "64"))
+CHUNK_SIZE = 256
+
+# Model, drug catalog, recommendation table and interaction index for the workers. Set in the parent
+# right before the pool is forked (see BatchRecommender.start), so children share them copy-on-write.
+_worker_state = {}
+
+
+def regimen_key(drug_names):
+    """Canonical form of a regimen: recommend_with_ml sees drugs in dataset order, not input order."""
+    return tuple(sorted({str(name).strip().upper() for name in drug_names if name and str(name).strip()}))
+
+
+def score_regimen(model, catalog, table, key, interactions=None):
+    """
+    Recommends alternatives for one regimen and prices the switch per member per month.
+    """
+    positions = catalog.name_positions(key)
+    if not len(positions):
+        return {'status': 'not_found', 'original_drugs': [], 'recommended_drugs': [], 'saving_per_member': 0.0}
+
+    originals = catalog.records(positions)
+    recommended = recommend_with_ml(model, originals, catalog, table, interactions)
+    if recommended is None:
+        return {
+            'status': 'no_recommendation',
+            'original_drugs': [drug['drug_name'] for drug in originals],
+            'recommended_drugs': [],
+            'saving_per_member': 0.0
+        }
+
+    # Recommendations come one per slot; duplicate drug names share a slot
+    replaced = regimen_slots(originals)
+    original_cost = float(sum(drug['pmpm_cost'] for drug in replaced))
+    recommended_cost = float(sum(drug['pmpm_cost'] for drug in recommended))
+    return {
+        'status': 'ok',
+        'original_drugs': [drug['drug_name'] for drug in originals],
+        'recommended_drugs': [drug['drug_name'] for drug in recommended],
+        'original_cost': original_cost,
+        'recommended_cost': recommended_cost,
+        'saving_per_member': original_cost - recommended_cost
+    }
+
+
+def _init_worker():
+    # Torch thread pools don't survive fork well; one thread per worker process.
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(1)
+
+
+def _score_chunk(keys):
+    state = _worker_state
+    return [
+        (key, score_regimen(state['model'], state['catalog'], state['table'], key, state['interactions']))
+        for key in keys
+    ]
+
+
+class BatchRecommender:
+    """
+    Scores many regimens at once. Identical regimens are scored once. Once start()
+    has forked the worker pool, the unique ones are fanned out over it; the workers
+    share the model and data they were forked with, so batches read from any later
+    snapshot (after an insert) are scored inline instead.
+    """
+
+    def __init__(self, workers=BATCH_WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._pool_version = None
+
+    def start(self, model, catalog, table, interactions, version):
+        """
+        Forks the worker pool for one snapshot. Call it once, from a single-threaded
+        point such as startup: a lock held by another thread at fork time (metrics,
+        NLP loading, torch) would stay locked forever in the workers.
+        Returns False if batches will be scored inline.
+        """
+        can_fork = 'fork' in multiprocessing.get_all_start_methods()
+        if self._pool is not None or self.workers <= 1 or not can_fork:
+            return False
+        _worker_state.update(model=model, catalog=catalog, table=table, interactions=interactions)
+        self._pool = multiprocessing.get_context('fork').Pool(self.workers, initializer=_init_worker)
+        self._pool_version = version
+        return True
+
+    def close(self):
+        """Lets queued batches finish, then stops the workers."""
+        pool, self._pool, self._pool_version = self._pool, None, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def _scored_chunks(self, model, catalog, table, interactions, version, keys):
+        chunks = [keys[i:i + CHUNK_SIZE] for i in range(0, len(keys), CHUNK_SIZE)]
+        pool = self._pool
+        if pool is None or self._pool_version != version or len(keys) < INLINE_THRESHOLD:
+            for chunk in chunks:
+                yield [(key, score_regimen(model, catalog, table, key, interactions)) for key in chunk]
+            return
+        yield from pool.imap(_score_chunk, chunks)
+
+    def recommend(self, model, catalog, table, version, rows, interactions=None):
+        """
+        Yields one result per input row, in input order, as soon as its regimen
+        has been scored, followed by a final {'summary': ...} record.
+        `interactions` is the InteractionIndex matching the catalog.
+
+        Each row is a dict with 'drug_names' and optionally 'member_id' and
+        'members' (member count the saving applies to, default 1).
+        """
+        keyed_rows = [(row, regimen_key(row.get('drug_names', []))) for row in rows]
+        unique_keys = list(dict.fromkeys(key for _, key in keyed_rows if key))
+
+        results = {(): {'status': 'empty', 'original_drugs': [], 'recommended_drugs': [], 'saving_per_member': 0.0}}
+        pending = deque(keyed_rows)
+        total_saving = 0.0
+        rows_with_saving = 0
+
+        def ready_rows():
+            nonlocal total_saving, rows_with_saving
+            while pending and pending[0][1] in results:
+                row, key = pending.popleft()
+                result = results[key]
+                members = row.get('members')
+                members = 1.0 if members is None or pd.isna(members) else float(members)
+                saving = max(0.0, result['saving_per_member']) * members
+                total_saving += saving
+                rows_with_saving += saving > 0
+                yield {'member_id': row.get('member_id'), 'members': members, 'monthly_saving': saving, **result}
+
+        yield from ready_rows()
+        for scored in self._scored_chunks(model, catalog, table, interactions, version, unique_keys):
+            results.update(scored)
+            yield from ready_rows()
+
+        yield {'summary': {
+            'rows': len(keyed_rows),
+            'unique_regimens': len(unique_keys),
+            'rows_with_saving': rows_with_saving,
+            'total_monthly_saving': total_saving,
+            'total_annual_saving': total_saving * 12
+        }}
+
+
+def parse_regimen_csv(file):
+    """
+    Reads regimens from a claims CSV. Accepts either one row per regimen with a
+    'drug_names' column (names separated by ';' or '|'), or one row per claim
+    with 'member_id' and 'drug_name' columns, grouped per member.
+    Optional 'members' column weights the savings.
+    """
+    claims = pd.read_csv(file)
+    claims.columns = claims.columns.str.strip()
+
+    if 'drug_names' in claims.columns:
+        rows = []
+        for record in claims.to_dict('records'):
+            names = str(record.get('drug_names', '')).replace('|', ';').split(';')
+            rows.append({'member_id': record.get('member_id'), 'members': record.get('members'), 'drug_names': names})
+        return rows
+
+    if {'member_id', 'drug_name'} <= set(claims.columns):
+        grouped = claims.groupby('member_id', sort=False)
+        members = grouped['members'].first() if 'members' in claims.columns else None
+        return [
+            {'member_id': member_id, 'members': None if members is None else members[member_id], 'drug_names': list(names)}
+            for member_id, names in grouped['drug_name']
+        ]
+
+    raise ValueError("CSV needs a 'drug_names' column, or 'member_id' and 'drug_name' columns")
@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+# Offline and repeatable: no persistent verdict cache and no BART warm-up.
+# Set before app is imported, which reads them at import time.
+os.environ.setdefault("NLP_CACHE_PATH", "")
+os.environ.setdefault("NLP_WARMUP", "0")
+
+import numpy as np
+
+import app as recommender
+from aggregates import AggregateStore
+from columnar_store import convert_csv
+from drug_catalog import DrugCatalog
+from drug_search import DrugSearchIndex
+from ingest import DrugStore
+from recommendation_table import RecommendationTable
+from synthetic_formulary import write_formulary
+
+
+DEFAULT_SIZES = [1_000, 10_000]
+# A stage counts as a regression in --compare when its median time grows by more than
+# this factor and by at least MIN_REGRESSION_MS (sub-millisecond stages are mostly noise).
+REGRESSION_FACTOR = 1.2
+MIN_REGRESSION_MS = 1.0
+
+
+class StubClassifier:
+    """
+    Stands in for the BART zero-shot pipeline: a deterministic verdict per text
+    from its CRC32, about a third of them 'high risk'. Counts calls and texts.
+    """
+
+    def __init__(self, high_risk_share=3):
+        self.high_risk_share = high_risk_share
+        self.calls = 0
+        self.texts = 0
+
+    def __call__(self, sequences, candidate_labels, **kwargs):
+        single = isinstance(sequences, str)
+        sequences = [sequences] if single else list(sequences)
+        self.calls += 1
+        self.texts += len(sequences)
+        results = []
+        for text in sequences:
+            high = zlib.crc32(text.encode("utf-8")) % self.high_risk_share == 0
+            labels = list(candidate_labels) if high else list(candidate_labels)[::-1]
+            results.append({'sequence': text, 'labels': labels, 'scores': [0.7, 0.3]})
+        return results[0] if single else results
+
+
+def summarize(samples):
+    samples = np.asarray(samples, dtype=float) * 1000
+    return {
+        'runs': len(samples),
+        'mean_ms': float(samples.mean()),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'min_ms': float(samples.min()),
+        'max_ms': float(samples.max()),
+    }
+
+
+def timed(fn, repeat=1):
+    """Runs fn `repeat` times; returns (last result, timing summary)."""
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return result, summarize(samples)
+
+
+def timed_each(fn, inputs):
+    """Times fn once per input; returns a timing summary."""
+    samples = []
+    for item in inputs:
+        started = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples) if samples else None
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def _install_server_state(store, catalog, search, model, metrics, table):
+    """Publishes the state built by the benchmark as the Flask app's current snapshot."""
+    import server
+
+    server.drug_store = store
+    df = store.frame()
+    server.snapshots.update(
+        df=df, catalog=catalog, search=search, interactions=recommender.interaction_index,
+        aggregates=AggregateStore(df), model=model,
+        model_metadata={'fingerprint': 'benchmark', 'metrics': metrics}, table=table
+    )
+    server.model_state = "ready"
+    return server
+
+
+def bench_endpoints(server, catalog, rng, repeat, samples):
+    client = server.app.test_client()
+    names = catalog.values('drug_name', np.arange(len(catalog)))
+    sample = lambda k, count: [[str(name) for name in rng.choice(names, size=k, replace=False)] for _ in range(count)]
+
+    requests = {
+        'GET /api/health': lambda: client.get('/api/health'),
+        'GET /api/drugs?limit=100': lambda: client.get('/api/drugs?limit=100'),
+        'GET /api/drug-stats': lambda: client.get('/api/drug-stats'),
+        'GET /api/therapeutic-classes': lambda: client.get('/api/therapeutic-classes'),
+        'GET /api/cost-analysis': lambda: client.get('/api/cost-analysis'),
+    }
+    results = {}
+    for name, send in requests.items():
+        _, results[name] = timed(send, repeat)
+
+    # Typeahead prefixes and misspellings (one letter dropped) of sampled names
+    queries = [name[:3] for name, in sample(1, samples)] + [
+        name[:len(name) // 2] + name[len(name) // 2 + 1:] for name, in sample(1, samples)
+    ]
+    results['GET /api/search'] = timed_each(lambda query: client.get('/api/search', query_string={'q': query}), queries)
+
+    recommend = lambda drug_names: client.post('/api/recommend', json={'drug_names': drug_names})
+    results['POST /api/recommend (1 drug)'] = timed_each(recommend, sample(1, samples))
+    results['POST /api/recommend (2 drugs)'] = timed_each(recommend, sample(2, samples))
+    results['POST /api/recommend (3 drugs)'] = timed_each(recommend, sample(3, max(1, samples // 5)))
+    regimens = sample(2, min(200, samples * 4))
+    _, results['POST /api/recommend/batch'] = timed(
+        lambda: client.post('/api/recommend/batch', json=regimens).get_data(), repeat
+    )
+
+    # Last, since it changes the dataset.
+    counter = iter(range(repeat))
+    _, results['POST /api/add-drug'] = timed(lambda: client.post('/api/add-drug', json={
+        'ndc': f"99999-{next(counter):04d}-00", 'drug_name': f"BENCHMARK {time.perf_counter_ns()}",
+        'generic_name': str(rng.choice(names)), 'therapeutic_class': str(catalog.values('therapeutic_class', [0])[0]),
+        'pmpm_cost': 12.5, 'therapeutic_equivalence_code': 'AB'
+    }), repeat)
+    return results
+
+
+def bench_size(n_drugs, seed, repeat, samples, workdir):
+    """Runs every stage on a synthetic formulary of n_drugs rows."""
+    rng = np.random.default_rng(seed)
+    classifier = StubClassifier()
+    recommender.set_nlp_classifier(classifier)
+    recommender.verdict_cache.clear()
+    stages = {}
+
+    csv_path = os.path.join(workdir, f"synthetic_{n_drugs}.csv")
+    _, stages['generate_formulary'] = timed(lambda: write_formulary(csv_path, n_drugs, seed))
+
+    df, stages['load_and_clean_data (csv)'] = timed(lambda: recommender.load_and_clean_data(csv_path), repeat)
+    (columnar_path, _), stages['convert_csv (columnar)'] = timed(lambda: convert_csv(csv_path))
+    df, stages['load_and_clean_data (columnar)'] = timed(lambda: recommender.load_and_clean_data(columnar_path), repeat)
+
+    store = DrugStore(df)
+    catalog, stages['DrugCatalog'] = timed(lambda: DrugCatalog(store.frame()))
+
+    search, stages['DrugSearchIndex'] = timed(lambda: DrugSearchIndex(store.frame()))
+
+    training_df, stages['create_training_data'] = timed(lambda: recommender.create_training_data(catalog))
+    stages['create_training_data']['rows'] = len(training_df)
+    stages['create_training_data']['classifier_texts'] = classifier.texts
+
+    (model, metrics), stages['train_ml_model'] = timed(
+        lambda frame=training_df: recommender.train_ml_model(frame, return_metrics=True)
+    )
+    stages['train_ml_model']['rmse'] = metrics['rmse']
+    del training_df
+
+    table, stages['RecommendationTable'] = timed(lambda: RecommendationTable(model, catalog))
+
+    # Request-time paths, on drugs that can be replaced.
+    replaceable = np.flatnonzero(catalog.is_equivalent == 1)
+    picks = lambda k, count: [catalog.records(rng.choice(replaceable, size=k, replace=False)) for _ in range(count)]
+    # The regimen optimizer is much slower per call than the other paths.
+    singles, pairs, triples = picks(1, samples), picks(2, samples), picks(3, max(1, samples // 5))
+    stages['recommend_with_ml (1 drug, table)'] = timed_each(
+        lambda drugs: recommender.recommend_with_ml(model, drugs, catalog, table), singles)
+    stages['recommend_with_ml (1 drug, no table)'] = timed_each(
+        lambda drugs: recommender.recommend_with_ml(model, drugs, catalog), singles)
+    stages['recommend_with_ml (2 drugs)'] = timed_each(
+        lambda drugs: recommender.recommend_with_ml(model, drugs, catalog, table), pairs)
+    stages['recommend_with_ml (3 drugs)'] = timed_each(
+        lambda drugs: recommender.recommend_with_ml(model, drugs, catalog, table), triples)
+
+    stages['DrugSearchIndex.search'] = timed_each(
+        lambda name: search.search(name[:len(name) // 2] + name[len(name) // 2 + 1:]),
+        [str(name) for name in rng.choice(catalog.values('drug_name', np.arange(len(catalog))), size=samples)]
+    )
+
+    server = _install_server_state(store, catalog, search, model, metrics, table)
+    stages.update(bench_endpoints(server, catalog, rng, repeat, samples))
+
+    return {
+        'drugs': n_drugs,
+        'therapeutic_classes': len(list(catalog.classes())),
+        'classifier_calls': classifier.calls,
+        'peak_rss_mb': _peak_rss_mb(),
+        'stages': stages,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline, factor=REGRESSION_FACTOR):
+    """Prints median-time ratios against a baseline run; returns the regressed (size, stage) pairs."""
+    regressions = []
+    for size, result in current['results'].items():
+        old = baseline.get('results', {}).get(size)
+        if old is None:
+            continue
+        print(f"\n--- {size} drugs: current vs baseline ---")
+        for stage, timing in result['stages'].items():
+            old_timing = old['stages'].get(stage)
+            if not timing or not old_timing:
+                continue
+            old_ms, new_ms = old_timing['p50_ms'], timing['p50_ms']
+            ratio = new_ms / old_ms if old_ms else float('inf')
+            flag = "  ⚠️ regression" if ratio > factor and new_ms - old_ms >= MIN_REGRESSION_MS else ""
+            print(f"  {stage:<42} {old_ms:>10.2f} ms -> {new_ms:>10.2f} ms  x{ratio:.2f}{flag}")
+            if flag:
+                regressions.append((size, stage))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation pipeline on synthetic formularies.")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated formulary sizes (default: 1000,10000)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help="runs per repeated stage and endpoint")
+    parser.add_argument('--samples', type=int, default=50, help="drugs/regimens sampled per recommend stage")
+    parser.add_argument('--out', default='bench_results.json', help="JSON results file")
+    parser.add_argument('--compare', default=None, help="baseline results JSON to compare against")
+    parser.add_argument('--keep-data', action='store_true', help="keep the generated formularies")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pbm-bench-")
+    results = {}
+    try:
+        for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+            print(f"\n===== Benchmarking {size} drugs =====")
+            results[str(size)] = bench_size(size, args.seed, args.repeat, args.samples, workdir)
+    finally:
+        if args.keep_data:
+            print(f"ℹ️ Generated data kept in '{workdir}'.")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'samples': args.samples,
+            'classifier': 'stub',
+        },
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Benchmark results written to '{args.out}'.")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
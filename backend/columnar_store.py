@@ -0,0 +1,227 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+# Bump when the on-disk layout changes; older directories are then ignored.
+COLUMNAR_FORMAT_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+# String columns with more distinct values than this share of their rows (descriptions,
+# NDCs) are stored as plain text; the rest are dictionary-encoded.
+CATEGORICAL_MAX_RATIO = 0.5
+
+
+def default_columnar_path(csv_path):
+    """Where the converted copy of a CSV lives: data/x.csv -> data/x.columnar"""
+    return os.path.splitext(csv_path)[0] + ".columnar"
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': _file_sha256(csv_path)}
+
+
+def _write_strings(staging, stem, values):
+    """
+    Writes str values as a UTF-8 byte buffer and the int64 offsets of each value
+    in it (one more than there are values). Returns the manifest entry for them.
+    """
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    files = {'offsets': f"{stem}.offsets.npy", 'utf8': f"{stem}.utf8.npy"}
+    np.save(os.path.join(staging, files['offsets']), offsets)
+    np.save(os.path.join(staging, files['utf8']), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    return files
+
+
+def _read_strings(path, files):
+    """Decodes values written by _write_strings straight from the memory-mapped buffer."""
+    offsets = np.load(os.path.join(path, files['offsets']), mmap_mode='r')
+    buffer = memoryview(np.load(os.path.join(path, files['utf8']), mmap_mode='r'))
+    values = np.empty(len(offsets) - 1, dtype=object)
+    bounds = offsets.tolist()
+    for i in range(len(values)):
+        values[i] = str(buffer[bounds[i]:bounds[i + 1]], 'utf-8')
+    return values
+
+
+def write_columnar(df, out_dir, source=None):
+    """
+    Writes a cleaned DataFrame as .npy files per column plus a small manifest.
+
+    Numeric columns are stored as-is. String columns with few distinct values
+    are dictionary-encoded: integer codes (-1 for missing) and the distinct
+    values. Nearly unique string columns are stored as text: a UTF-8 buffer with
+    the offsets of each value, and a mask of missing ones. Other columns are
+    dictionary-encoded with their distinct values in the manifest. The directory
+    is staged and renamed into place, so readers never see a partial conversion.
+    """
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".columnar-", dir=parent)
+    try:
+        columns = []
+        for position, col in enumerate(df.columns):
+            series = df[col]
+            filename = f"{position:03d}.npy"
+            if series.dtype.kind in 'biuf':
+                np.save(os.path.join(staging, filename), series.to_numpy())
+                columns.append({'name': str(col), 'kind': 'numeric', 'file': filename})
+                continue
+
+            is_text = pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty')
+            categorical = pd.Categorical(series)
+            if is_text and len(categorical.categories) > CATEGORICAL_MAX_RATIO * len(series):
+                missing = series.isna().to_numpy()
+                column = {'name': str(col), 'kind': 'text', 'missing': None}
+                column.update(_write_strings(staging, f"{position:03d}", np.where(missing, '', series.to_numpy())))
+                if missing.any():
+                    column['missing'] = f"{position:03d}.missing.npy"
+                    np.save(os.path.join(staging, column['missing']), missing)
+                columns.append(column)
+                continue
+
+            np.save(os.path.join(staging, filename), categorical.codes)
+            column = {'name': str(col), 'kind': 'categorical', 'file': filename}
+            if is_text:
+                column['categories'] = _write_strings(staging, f"{position:03d}.categories", categorical.categories)
+            else:
+                column['categories'] = categorical.categories.tolist()
+            columns.append(column)
+
+        with open(os.path.join(staging, MANIFEST_NAME), "w") as f:
+            json.dump({
+                'format': COLUMNAR_FORMAT_VERSION,
+                'rows': len(df),
+                'columns': columns,
+                'source': source
+            }, f, indent=2)
+
+        if os.path.exists(out_dir):
+            retired = staging + ".old"
+            os.rename(out_dir, retired)
+            os.rename(staging, out_dir)
+            shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.rename(staging, out_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return out_dir
+
+
+def convert_csv(csv_path, out_dir=None):
+    """
+    Parses and cleans a drug CSV once and writes its columnar copy.
+    Returns (out_dir, cleaned DataFrame).
+    """
+    from app import clean_drug_frame
+
+    out_dir = out_dir or default_columnar_path(csv_path)
+    df = clean_drug_frame(pd.read_csv(csv_path))
+    write_columnar(df, out_dir, source=_source_signature(csv_path))
+    return out_dir, df
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != COLUMNAR_FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def is_current(path, csv_path):
+    """
+    True if the columnar copy at `path` was converted from the CSV as it is now.
+    Size and mtime are checked first; the content hash only when the mtime moved
+    (e.g. after a fresh checkout).
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        return False
+    source = manifest.get('source')
+    if source is None or not os.path.exists(csv_path):
+        return True
+    stat = os.stat(csv_path)
+    if stat.st_size != source.get('size'):
+        return False
+    return stat.st_mtime_ns == source.get('mtime_ns') or _file_sha256(csv_path) == source.get('sha256')
+
+
+def find_columnar(filepath):
+    """
+    Returns the columnar directory to load for `filepath`, or None to parse the CSV.
+    `filepath` may be a columnar directory itself or a CSV with a converted copy next to it.
+    """
+    if os.path.isdir(filepath):
+        return filepath if read_manifest(filepath) is not None else None
+    path = default_columnar_path(filepath)
+    if not os.path.isdir(path):
+        return None
+    if is_current(path, filepath):
+        return path
+    print(f"ℹ️ Columnar copy '{path}' is out of date, parsing the CSV. Re-run columnar_store.py to refresh it.")
+    return None
+
+
+def load_columnar(path):
+    """
+    Opens a columnar dataset. Column files are memory-mapped read-only, so the
+    pages are loaded lazily and shared by every process that maps them.
+    Dictionary-encoded columns come back as pandas categoricals over the mapped codes.
+    Text columns are decoded from the mapped buffer into object arrays, as pandas
+    holds strings as Python objects (pre-forked workers share the loaded ones).
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise ValueError(f"'{path}' is not a columnar dataset (or was written by another format version)")
+
+    data = {}
+    for column in manifest['columns']:
+        if column['kind'] == 'text':
+            values = _read_strings(path, column)
+            if column['missing'] is not None:
+                values[np.load(os.path.join(path, column['missing']))] = np.nan
+            data[column['name']] = values
+            continue
+        values = np.load(os.path.join(path, column['file']), mmap_mode='r')
+        if column['kind'] == 'categorical':
+            categories = column['categories']
+            if isinstance(categories, dict):
+                categories = _read_strings(path, categories)
+            values = pd.Categorical.from_codes(values, categories=pd.Index(categories, dtype=object), validate=False)
+        data[column['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a drug CSV into the memory-mapped columnar format.")
+    parser.add_argument("csv", nargs="?", default="data/testtt01.csv", help="drug dataset CSV")
+    parser.add_argument("--out", default=None, help="output directory (default: next to the CSV, *.columnar)")
+    args = parser.parse_args()
+
+    out_dir, df = convert_csv(args.csv, args.out)
+    print(f"✅ Wrote {len(df)} rows x {len(df.columns)} columns to '{out_dir}'.")
+
+
+if __name__ == "__main__":
+    main()
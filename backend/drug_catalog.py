@@ -0,0 +1,174 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+INDEXED_COLUMNS = ('therapeutic_class', 'generic_name', 'drug_name')
+_NO_POSITIONS = np.empty(0, dtype=np.intp)
+_NO_POSITIONS.flags.writeable = False
+
+
+def _append(buffer, size, values):
+    """
+    Writes `values` after the first `size` entries of a growable buffer, doubling
+    its capacity when full like DrugStore. Returns the buffer (a new one if grown).
+    """
+    end = size + len(values)
+    if end > len(buffer):
+        capacity = max(16, len(buffer))
+        while capacity < end:
+            capacity *= 2
+        grown = np.empty(capacity, dtype=buffer.dtype)
+        grown[:size] = buffer[:size]
+        buffer = grown
+    buffer[size:end] = values
+    return buffer
+
+
+class DrugCatalog:
+    """
+    Row-position index over the cleaned dataset, built once after load.
+
+    For every therapeutic class, generic name and drug name it keeps the matching
+    row positions as one contiguous array, next to precomputed feature columns
+    (cost, TE-equivalence flag and integer codes for the indexed names).
+    Lookups return read-only views of those arrays, so finding candidates costs
+    O(group size) instead of a boolean-mask scan over the whole dataset.
+
+    The feature columns are views of growable buffers, so indexing appended rows
+    costs O(new rows) amortized. Catalogs derived with with_rows() share the
+    buffers: each only reads its own prefix, and only the newest one is extended.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._size = 0
+        self._costs = np.empty(0, dtype=float)
+        self._is_equivalent = np.empty(0, dtype=np.int8)
+        self._codes = {col: np.empty(0, dtype=np.int64) for col in INDEXED_COLUMNS}
+        # Decoded value of each code, shifted by one so that code -1 (missing) decodes to None
+        self._decoded = {col: np.array([None], dtype=object) for col in INDEXED_COLUMNS}
+        self._code_of = {col: {} for col in INDEXED_COLUMNS}
+        self._groups = {col: {} for col in INDEXED_COLUMNS}
+        self.extend(df, np.arange(len(df)))
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, df, new_positions):
+        """
+        Indexes rows appended to the dataset. `df` is the whole dataset including
+        them and `new_positions` are their row positions (always at the end).
+        Only the groups the new rows belong to are rebuilt.
+        """
+        new_positions = np.asarray(new_positions, dtype=np.intp)
+        rows = df.iloc[new_positions]
+        size = self._size
+
+        self._costs = _append(self._costs, size, rows['pmpm_cost'].to_numpy(dtype=float))
+        self._is_equivalent = _append(
+            self._is_equivalent, size, (rows['therapeutic_equivalence_code'].to_numpy() != 'NA').astype(np.int8)
+        )
+        for col in INDEXED_COLUMNS:
+            row_codes, uniques = pd.factorize(rows[col])
+            code_of = self._code_of[col]
+            n_codes = len(code_of)
+            global_codes = [code_of.setdefault(value, len(code_of)) for value in uniques]
+            added = np.empty(len(code_of) - n_codes, dtype=object)
+            added[:] = [value for value, code in zip(uniques, global_codes) if code >= n_codes]
+            self._decoded[col] = _append(self._decoded[col], n_codes + 1, added)
+            # Missing values keep code -1 and belong to no group.
+            global_codes = np.array(global_codes + [-1], dtype=np.int64)
+            self._codes[col] = _append(self._codes[col], size, global_codes[row_codes])
+
+            # Group the new rows by value (first-appearance order), then append to each group.
+            order = np.argsort(row_codes, kind='stable')
+            bounds = np.flatnonzero(np.diff(row_codes[order])) + 1
+            groups = self._groups[col]
+            for group in np.split(order, bounds) if len(order) else []:
+                if row_codes[group[0]] < 0:
+                    continue
+                value = uniques[row_codes[group[0]]]
+                members = new_positions[group]
+                existing = groups.get(value)
+                positions = members if existing is None else np.concatenate([existing, members])
+                positions.flags.writeable = False
+                groups[value] = positions
+
+        self._size = size + len(new_positions)
+        self.costs = self._costs[:self._size]
+        self.is_equivalent = self._is_equivalent[:self._size]
+        self.codes = {col: codes[:self._size] for col, codes in self._codes.items()}
+        self.df = df
+
+    def with_rows(self, df, new_positions):
+        """
+        Returns a new catalog that also indexes the appended rows. Groups the rows
+        don't touch are shared; this catalog is left as it was for in-flight readers.
+        """
+        catalog = copy.copy(self)
+        catalog._codes = dict(self._codes)
+        catalog._decoded = dict(self._decoded)
+        # Own code maps: a version that is built and then discarded must not leave codes behind
+        catalog._code_of = {col: dict(code_of) for col, code_of in self._code_of.items()}
+        catalog._groups = {col: dict(groups) for col, groups in self._groups.items()}
+        catalog.extend(df, new_positions)
+        return catalog
+
+    def positions(self, col, value):
+        """Row positions where `col` equals `value`, in dataset order (read-only view)."""
+        try:
+            return self._groups[col].get(value, _NO_POSITIONS)
+        except TypeError:
+            return _NO_POSITIONS
+
+    def class_positions(self, t_class):
+        return self.positions('therapeutic_class', t_class)
+
+    def name_positions(self, drug_names):
+        """Row positions of any of `drug_names`, in dataset order (like isin)."""
+        found = [self.positions('drug_name', name) for name in set(drug_names)]
+        found = [positions for positions in found if len(positions)]
+        if not found:
+            return _NO_POSITIONS
+        return np.sort(np.concatenate(found)) if len(found) > 1 else found[0]
+
+    def classes(self):
+        """(therapeutic class, row positions) for every class, in first-appearance order."""
+        return self._groups['therapeutic_class'].items()
+
+    def code(self, col, value):
+        """Integer code of a name in `col`, or -1 if the catalog has never seen it."""
+        try:
+            return self._code_of[col].get(value, -1)
+        except TypeError:
+            return -1
+
+    def values(self, col, positions):
+        """The `col` values at `positions`, decoded from the stored codes."""
+        return self._decoded[col][self.codes[col][positions] + 1]
+
+    def rows(self, positions):
+        return self.df.iloc[positions]
+
+    def records(self, positions):
+        return self.df.iloc[positions].to_dict('records')
+
+    def feature_frame(self, original_drug, positions):
+        """
+        Features for replacing `original_drug` with each drug at `positions`, with no
+        interaction risk. Same columns as app.candidate_feature_frame.
+        """
+        generic_code = self.code('generic_name', original_drug['generic_name'])
+        return pd.DataFrame({
+            'is_same_generic': (self.codes['generic_name'][positions] == generic_code).astype(np.int8),
+            'is_equivalent': self.is_equivalent[positions],
+            'cost_difference': original_drug['pmpm_cost'] - self.costs[positions],
+            'interaction_risk': np.zeros(len(positions), dtype=np.int8)
+        })
+
+
+def as_catalog(data):
+    """Accepts a DrugCatalog or a cleaned DataFrame, which is indexed on the spot."""
+    return data if isinstance(data, DrugCatalog) else DrugCatalog(data)
@@ -0,0 +1,227 @@
+import copy
+import math
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+
+SEARCH_FIELDS = ('drug_name', 'generic_name', 'ndc')
+_NDC_FIELD = SEARCH_FIELDS.index('ndc')
+# Matches sharing less of their trigrams with the query than this are dropped.
+MIN_SIMILARITY = float(os.environ.get("DRUG_SEARCH_MIN_SIMILARITY", "0.3"))
+# A misspelled drug name is only replaced by a match at least this similar.
+RESOLVE_MIN_SIMILARITY = float(os.environ.get("DRUG_RESOLVE_MIN_SIMILARITY", "0.5"))
+
+# Leading characters of every key kept in an array, to test prefixes without a Python loop.
+HEAD_CHARS = 8
+
+_NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+_NON_DIGIT = re.compile(r"[^0-9]+")
+_NO_TERMS = np.empty(0, dtype=np.int32)
+
+
+def normalize(field, value):
+    """Search key of a value: NDCs keep only their digits, names are uppercased words."""
+    text = str(value).upper()
+    if SEARCH_FIELDS[field] == 'ndc':
+        return _NON_DIGIT.sub("", text)
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def trigrams(key):
+    """Character trigrams of a key, padded so the leading ones also encode its prefix."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DrugSearchIndex:
+    """
+    Trigram index over drug names, generic names and NDCs, for typeahead and
+    for resolving misspelled names.
+
+    Each distinct (field, normalized value) is a term with the row positions
+    holding it; every trigram maps to an array of the terms containing it.
+    A query counts its shared trigrams per term with one bincount over the
+    postings of its own trigrams, so it costs O(matching postings), not a scan
+    of the dataset. Exact matches rank first, then prefix matches, then the
+    rest by trigram (Jaccard) similarity.
+    """
+
+    def __init__(self, df):
+        self._keys = []
+        self._values = []
+        self._positions = []
+        self._fields = np.empty(0, dtype=np.int8)
+        self._heads = np.empty(0, dtype=f"U{HEAD_CHARS}")
+        self._gram_counts = np.empty(0, dtype=np.int32)
+        self._term_of = {}
+        self._postings = {}
+        self.extend(df, np.arange(len(df)))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def extend(self, df, new_positions):
+        """
+        Indexes rows appended to the dataset. `df` is the whole dataset including
+        them and `new_positions` are their row positions.
+        """
+        new_positions = np.asarray(new_positions, dtype=np.intp)
+        rows = df.iloc[new_positions]
+        new_fields, new_heads, new_counts, new_postings = [], [], [], {}
+        for field, col in enumerate(SEARCH_FIELDS):
+            if col not in rows.columns:
+                continue
+            row_codes, uniques = pd.factorize(rows[col])
+            order = np.argsort(row_codes, kind='stable')
+            bounds = np.flatnonzero(np.diff(row_codes[order])) + 1
+            for group in np.split(order, bounds) if len(order) else []:
+                if row_codes[group[0]] < 0:
+                    continue
+                value = uniques[row_codes[group[0]]]
+                key = normalize(field, value)
+                if not key:
+                    continue
+                members = new_positions[group]
+                term = self._term_of.get((field, key))
+                if term is not None:
+                    self._positions[term] = np.concatenate([self._positions[term], members])
+                    continue
+                term = self._term_of[(field, key)] = len(self._keys)
+                self._keys.append(key)
+                self._values.append(value)
+                self._positions.append(members)
+                grams = trigrams(key)
+                new_fields.append(field)
+                new_heads.append(key[:HEAD_CHARS])
+                new_counts.append(len(grams))
+                for gram in grams:
+                    new_postings.setdefault(gram, []).append(term)
+
+        self._fields = np.concatenate([self._fields, np.array(new_fields, dtype=np.int8)])
+        self._heads = np.concatenate([self._heads, np.array(new_heads, dtype=f"U{HEAD_CHARS}")])
+        self._gram_counts = np.concatenate([self._gram_counts, np.array(new_counts, dtype=np.int32)])
+        for gram, terms in new_postings.items():
+            terms = np.array(terms, dtype=np.int32)
+            existing = self._postings.get(gram)
+            self._postings[gram] = terms if existing is None else np.concatenate([existing, terms])
+
+    def with_rows(self, df, new_positions):
+        """
+        Returns a new index that also covers the appended rows. Postings the rows
+        don't touch are shared; this index is left as it was for in-flight readers.
+        """
+        index = copy.copy(self)
+        index._keys = list(self._keys)
+        index._values = list(self._values)
+        index._positions = list(self._positions)
+        index._term_of = dict(self._term_of)
+        index._postings = dict(self._postings)
+        index.extend(df, new_positions)
+        return index
+
+    def _candidates(self, key, fields, min_similarity):
+        """
+        Terms of `fields` sharing enough trigrams with `key` to reach min_similarity
+        or to start with it. Returns (terms, shared trigrams, query trigrams,
+        prefix flags).
+        """
+        grams = trigrams(key)
+        postings = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not postings:
+            return _NO_TERMS, _NO_TERMS, len(grams), np.zeros(0, dtype=bool)
+        shared = np.bincount(np.concatenate(postings), minlength=len(self._keys))
+        # Jaccard similarity is at most shared / query trigrams, so this keeps every
+        # term that can reach min_similarity, and every prefix match
+        needed = max(1, min(math.ceil(min_similarity * len(grams)), len(grams) - 1))
+        terms = np.flatnonzero(shared >= needed)
+        allowed = np.zeros(len(SEARCH_FIELDS), dtype=bool)
+        allowed[list(fields)] = True
+        terms = terms[allowed[self._fields[terms]]]
+        shared = shared[terms]
+
+        if len(key) <= HEAD_CHARS:
+            is_prefix = self._heads[terms].astype(f"U{len(key)}") == key
+        else:
+            # A term starting with the key holds all its trigrams but the closing one
+            is_prefix = shared >= len(grams) - 1
+            for i in np.flatnonzero(is_prefix):
+                is_prefix[i] = self._keys[terms[i]].startswith(key)
+        return terms, shared, len(grams), is_prefix
+
+    def _score(self, query, fields, min_similarity):
+        """
+        Scores the terms of `fields` against the query. Returns (terms, score,
+        similarity) arrays: the score adds 1 for a prefix match and 1 more for an
+        exact one on top of the trigram similarity.
+        """
+        name_key = normalize(SEARCH_FIELDS.index('drug_name'), query)
+        by_key = {}
+        if name_key:
+            by_key[name_key] = [field for field in fields if field != _NDC_FIELD]
+            # Digits-only queries are also matched against NDCs
+            ndc_key = normalize(_NDC_FIELD, query)
+            if _NDC_FIELD in fields and ndc_key and not any(c.isalpha() for c in name_key):
+                by_key.setdefault(ndc_key, []).append(_NDC_FIELD)
+
+        found_terms, found_scores, found_similarity = [_NO_TERMS], [np.empty(0)], [np.empty(0)]
+        for key, key_fields in by_key.items():
+            if not key_fields or not len(self._keys):
+                continue
+            terms, shared, query_grams, is_prefix = self._candidates(key, key_fields, min_similarity)
+            similarity = shared / (query_grams + self._gram_counts[terms] - shared)
+            bonus = is_prefix.astype(float)
+            exact = [self._term_of.get((field, key), -1) for field in key_fields]
+            bonus[np.isin(terms, exact)] += 1.0
+            keep = (similarity >= min_similarity) | is_prefix
+            found_terms.append(terms[keep])
+            found_scores.append((similarity + bonus)[keep])
+            found_similarity.append(similarity[keep])
+        return np.concatenate(found_terms), np.concatenate(found_scores), np.concatenate(found_similarity)
+
+    def search(self, query, limit=10, min_similarity=MIN_SIMILARITY):
+        """
+        Best matches for a typeahead query, as dicts with the row `position`, the
+        `field` and `value` that matched and its `score`, at most `limit` rows.
+        A row matching on several fields is listed once, by its best match.
+        """
+        terms, scores, _ = self._score(query, range(len(SEARCH_FIELDS)), min_similarity)
+        # Enough of the best terms to fill the page even if they share rows
+        keep = limit * len(SEARCH_FIELDS)
+        if len(terms) > keep:
+            top = np.argpartition(-scores, keep - 1)[:keep]
+            terms, scores = terms[top], scores[top]
+        ranked = sorted(zip(terms.tolist(), scores.tolist()),
+                        key=lambda item: (-item[1], self._fields[item[0]], self._keys[item[0]]))
+
+        matches, seen = [], set()
+        for term, score in ranked:
+            for position in self._positions[term].tolist():
+                if position in seen:
+                    continue
+                seen.add(position)
+                matches.append({
+                    'position': position,
+                    'field': SEARCH_FIELDS[self._fields[term]],
+                    'value': self._values[term],
+                    'score': round(score, 4),
+                })
+                if len(matches) >= limit:
+                    return matches
+        return matches
+
+    def resolve(self, name, field='drug_name', min_similarity=RESOLVE_MIN_SIMILARITY):
+        """
+        The indexed `field` value closest to a possibly misspelled name, or None
+        when nothing is similar enough or two values are equally close.
+        """
+        terms, _, similarity = self._score(name, [SEARCH_FIELDS.index(field)], min_similarity)
+        terms, similarity = terms[similarity >= min_similarity], similarity[similarity >= min_similarity]
+        if not len(terms):
+            return None
+        best = np.argsort(-similarity, kind='stable')[:2]
+        if len(best) > 1 and math.isclose(similarity[best[0]], similarity[best[1]]):
+            return None
+        return self._values[terms[best[0]]]
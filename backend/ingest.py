@@ -0,0 +1,237 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import app as recommender
+from drug_catalog import DrugCatalog
+
+
+REQUIRED_FIELDS = ['ndc', 'drug_name', 'generic_name', 'therapeutic_class', 'pmpm_cost']
+INCREMENTAL_ROUNDS = int(os.environ.get("INCREMENTAL_ROUNDS", "10"))
+# Matches the LGBMRegressor defaults used by train_ml_model.
+BOOSTER_PARAMS = {'objective': 'regression', 'learning_rate': 0.1, 'num_leaves': 31, 'seed': 42, 'verbosity': -1}
+
+
+class DrugStore:
+    """
+    Growable columnar buffer holding the cleaned dataset.
+
+    Each column is a NumPy array with spare capacity that doubles when full, so
+    appending rows is amortized O(1) per row. frame() exposes the filled prefix
+    as a DataFrame without copying the column data. Categorical columns are kept
+    as codes plus categories. The initial arrays are used as they are (for a
+    memory-mapped dataset they stay shared pages) until the first append.
+    """
+
+    def __init__(self, df):
+        self.columns = list(df.columns)
+        self._size = len(df)
+        self._arrays = {}
+        self._categories = {}
+        for col in self.columns:
+            values = df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                self._categories[col] = values.cat.categories
+                self._arrays[col] = values.cat.codes.to_numpy()
+            else:
+                self._arrays[col] = values.to_numpy()
+        self.version = 0
+        self._frame = None
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, needed):
+        capacity = len(next(iter(self._arrays.values())))
+        if needed <= capacity:
+            return
+        capacity = max(16, capacity)
+        while capacity < needed:
+            capacity *= 2
+        for col, array in self._arrays.items():
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            self._arrays[col] = grown
+
+    def _encode(self, col, values):
+        """Codes for a categorical column, adding categories it hasn't seen yet."""
+        categories = self._categories[col]
+        unseen = ~pd.isna(values) & (categories.get_indexer(values) < 0)
+        if unseen.any():
+            categories = categories.append(pd.Index(pd.unique(values[unseen]), dtype=object))
+            self._categories[col] = categories
+            code_dtype = _code_dtype(len(categories))
+            if code_dtype.itemsize > self._arrays[col].dtype.itemsize:
+                self._arrays[col] = self._arrays[col].astype(code_dtype)
+        return categories.get_indexer(values)
+
+    def _coerce(self, col, values):
+        """Values in the column's dtype, widening it only between numeric types (or to object)."""
+        array = self._arrays[col]
+        if array.dtype.kind in 'biuf' and values.dtype.kind not in 'biuf':
+            # e.g. avg_age sent as "45": parse it rather than turn the whole column into objects
+            values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy()
+        if array.dtype.kind in 'biuf' and values.dtype.kind in 'biuf':
+            target = np.result_type(array.dtype, values.dtype)
+            if array.dtype.kind in 'biu' and pd.isna(values).any():
+                target = np.result_type(target, np.float64)
+        else:
+            target = array.dtype if array.dtype == values.dtype else np.dtype(object)
+        if target != array.dtype:
+            self._arrays[col] = array.astype(target)
+        return values.astype(target, copy=False)
+
+    def append(self, rows):
+        """
+        Appends an already-cleaned DataFrame. Columns the store doesn't have are
+        ignored; missing ones are filled with NaN. Returns the new row positions.
+        """
+        start = self._size
+        end = start + len(rows)
+        self._grow(end)
+        for col in self.columns:
+            values = rows[col].to_numpy() if col in rows.columns else np.full(len(rows), np.nan)
+            if col in self._categories:
+                self._arrays[col][start:end] = self._encode(col, values)
+            else:
+                self._arrays[col][start:end] = self._coerce(col, values)
+        self._size = end
+        self.version += 1
+        self._frame = None
+        return np.arange(start, end)
+
+    def truncate(self, size):
+        """Drops the rows from position `size` on, undoing an append whose derived state failed."""
+        if size < self._size:
+            self._size = size
+            self.version += 1
+            self._frame = None
+
+    def frame(self):
+        """The current rows as a DataFrame sharing the buffer's memory."""
+        if self._frame is None:
+            columns = {}
+            for col, array in self._arrays.items():
+                if col in self._categories:
+                    columns[col] = pd.Categorical.from_codes(
+                        array[:self._size], categories=self._categories[col], validate=False
+                    )
+                else:
+                    columns[col] = array[:self._size]
+            self._frame = pd.DataFrame(columns, copy=False)
+        return self._frame
+
+
+def _code_dtype(n_categories):
+    # Same widths pandas picks for categorical codes, so frame() never recasts them.
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def missing_fields(row):
+    return [field for field in REQUIRED_FIELDS if field not in row or row[field] is None]
+
+
+def new_training_pairs(catalog, new_positions):
+    """
+    Returns (a_positions, b_positions) for every ordered pair within a class that
+    involves at least one of the new rows, in both directions.
+    """
+    names = catalog.codes['drug_name']
+    is_new = np.zeros(len(catalog), dtype=bool)
+    is_new[new_positions] = True
+
+    a_parts, b_parts = [], []
+    for t_class in pd.unique(catalog.values('therapeutic_class', new_positions)):
+        members = catalog.class_positions(t_class)
+        new_members = members[is_new[members]]
+        old_members = members[~is_new[members]]
+        # new x all members, then old x new
+        a_parts += [np.repeat(new_members, len(members)), np.repeat(old_members, len(new_members))]
+        b_parts += [np.tile(members, len(new_members)), np.tile(new_members, len(old_members))]
+
+    if not a_parts:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    a_positions, b_positions = np.concatenate(a_parts), np.concatenate(b_parts)
+    keep = names[a_positions] != names[b_positions]
+    return a_positions[keep], b_positions[keep]
+
+
+def continue_training(model, training_chunk, rounds=INCREMENTAL_ROUNDS):
+    """
+    Continues boosting from the current model on the new training pairs only.
+    Returns a new Booster; the one passed in is left untouched for in-flight readers.
+    """
+    import lightgbm as lgb
+
+    booster = model.booster_ if hasattr(model, 'booster_') else model
+    train_set = lgb.Dataset(
+        training_chunk[recommender.FEATURES], label=training_chunk['alternative_score'], free_raw_data=False
+    )
+    return lgb.train(BOOSTER_PARAMS, train_set, num_boost_round=rounds, init_model=booster, keep_training_booster=True)
+
+
+def ingest_drugs(store, rows, model=None, table=None, catalog=None, interactions=None):
+    """
+    Cleans and appends new drug rows, then derives updated state: drug catalog,
+    interaction index, recommendation table for the affected classes, and
+    the model via continued training on the new pairs. The catalog, interaction
+    index (default: the loaded one), table and model passed in are left
+    unchanged for readers still using them.
+
+    Returns a dict with the new model, catalog, interaction index and table, the
+    cleaned rows, their row positions and counts.
+    """
+    raw = pd.DataFrame(list(rows))
+    received = len(raw)
+    cleaned = recommender.clean_drug_frame(raw) if received else raw
+    if interactions is None:
+        interactions = recommender.interaction_index
+    result = {
+        'model': model, 'catalog': catalog, 'interaction_index': interactions, 'table': table, 'added': cleaned,
+        'positions': np.empty(0, dtype=np.intp), 'received': received,
+        'rejected': received - len(cleaned), 'new_pairs': 0
+    }
+    if cleaned.empty:
+        return result
+
+    new_positions = store.append(cleaned)
+    try:
+        _derive_state(result, store.frame(), new_positions, model, table, catalog, interactions)
+    except Exception:
+        # Leave the store matching the snapshot that is still published
+        store.truncate(new_positions[0])
+        raise
+
+    print(f"✅ Ingested {len(cleaned)} drug(s), {result['rejected']} rejected, {result['new_pairs']} new training pairs.")
+    return result
+
+
+def _derive_state(result, df, new_positions, model, table, catalog, interactions):
+    """
+    Fills `result` with the catalog, interaction index, model and table covering
+    the rows appended at `new_positions`.
+    """
+    cleaned = result['added']
+    result['positions'] = new_positions
+    catalog = catalog.with_rows(df, new_positions) if catalog is not None else DrugCatalog(df)
+    result['catalog'] = catalog
+    # Copy-on-write like the catalog: requests already reading the old index keep it
+    interactions = result['interaction_index'] = interactions.with_rows(cleaned)
+
+    if model is not None:
+        a_positions, b_positions = new_training_pairs(catalog, new_positions)
+        result['new_pairs'] = len(a_positions)
+        if len(a_positions):
+            training_chunk = recommender.build_training_chunk(
+                catalog, a_positions, b_positions, interactions=interactions
+            )
+            result['model'] = continue_training(model, training_chunk)
+
+    if table is not None:
+        # Scored with the table's own model: re-scoring only these classes with the
+        # continued booster would mix two models' rankings in one table
+        result['table'] = table.with_classes(catalog, cleaned['therapeutic_class'].unique(), interactions)
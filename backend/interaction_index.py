@@ -0,0 +1,218 @@
+import ast
+import copy
+from collections import deque
+
+
+# with_rows() keeps new entries in a small overlay and folds it into the shared
+# entries once it reaches this fraction of them, so an insert costs O(new rows) amortized.
+OVERLAY_FRACTION = 8
+MIN_OVERLAY = 64
+
+
+class NameMatcher:
+    """
+    Aho-Corasick automaton over lowercase drug and generic names.
+
+    Finds every name occurring in a text in a single pass, however many names
+    the formulary holds.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = frozenset(p for p in patterns if p)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for pattern in self.patterns:
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = next_state
+            self._out[state] = (pattern,)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(ch, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def find_all(self, text):
+        """Returns the set of patterns that occur anywhere in `text`."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+def parse_interactions(interactions_data):
+    """
+    Parses a `drug_interactions` cell into a list of descriptions.
+    Raises ValueError/SyntaxError for malformed list literals.
+    """
+    if isinstance(interactions_data, str) and interactions_data.startswith('['):
+        return ast.literal_eval(interactions_data)
+    return [str(interactions_data)]
+
+
+class _Entry:
+    __slots__ = ("descriptions", "mentions", "error")
+
+    def __init__(self, descriptions=(), mentions=None, error=None):
+        self.descriptions = descriptions
+        self.mentions = mentions or {}
+        self.error = error
+
+
+def _entry_key(interactions_data):
+    return (isinstance(interactions_data, str), str(interactions_data))
+
+
+class InteractionIndex:
+    """
+    Pre-parsed drug interaction lists keyed by the raw `drug_interactions` value.
+
+    Each entry maps every known drug/generic name mentioned by the list to the
+    position of the first description mentioning it, so finding the description
+    that links two drugs is a couple of dictionary lookups. Names the index
+    doesn't know (drugs outside the dataset, or added by with_rows) are found by
+    scanning the descriptions of the one list being looked at.
+
+    Read-only once built: find() never changes it, and new rows go into a copy
+    (with_rows), so concurrent requests can share an index without locks.
+    """
+
+    def __init__(self, names=()):
+        self._names = set()
+        self._matcher = NameMatcher(())
+        self._entries = {}
+        # Entries added by with_rows since the last fold into _entries
+        self._recent = {}
+        self.add_names(names)
+
+    @classmethod
+    def from_frame(cls, df):
+        index = cls()
+        index._add_rows(df)
+        return index
+
+    def with_rows(self, rows):
+        """
+        Returns a new index that also covers the interaction lists of `rows`,
+        leaving this one as it was for in-flight readers. Only the new lists are
+        parsed and matched; the names and the matcher are shared, so the new
+        rows' names are looked up by scanning (see _first_mention).
+        """
+        index = copy.copy(self)
+        index._recent = dict(self._recent)
+        for interactions_data in rows['drug_interactions'].unique():
+            key = _entry_key(interactions_data)
+            if index._lookup(key) is None:
+                index._recent[key] = index._build_entry(interactions_data)
+        if len(index._recent) > max(MIN_OVERLAY, len(index._entries) // OVERLAY_FRACTION):
+            index._entries = {**index._entries, **index._recent}
+            index._recent = {}
+        return index
+
+    def _add_rows(self, rows):
+        self.add_names(list(rows['drug_name'].str.lower()) + list(rows['generic_name'].str.lower()))
+        for interactions_data in rows['drug_interactions'].unique():
+            key = _entry_key(interactions_data)
+            if key not in self._entries:
+                self._entries[key] = self._build_entry(interactions_data)
+
+    def _lookup(self, key):
+        entry = self._recent.get(key)
+        return entry if entry is not None else self._entries.get(key)
+
+    def add_names(self, names):
+        """
+        Registers new drug/generic names while the index is being built. Existing
+        entries are scanned for the new names only, with a small matcher built
+        over just those names; entries that gain mentions are replaced by copies.
+        """
+        new_names = {str(name).lower() for name in names} - self._names
+        if not new_names:
+            return
+        self._names |= new_names
+        self._matcher = NameMatcher(self._names)
+
+        new_matcher = NameMatcher(new_names)
+        for key, entry in list(self._entries.items()):
+            mentions = None
+            for position, desc in enumerate(entry.descriptions):
+                for name in new_matcher.find_all(str(desc).lower()):
+                    if mentions is None:
+                        mentions = dict(entry.mentions)
+                    mentions.setdefault(name, position)
+            if mentions is not None:
+                self._entries[key] = _Entry(entry.descriptions, mentions, entry.error)
+
+    def _entry(self, interactions_data):
+        """The indexed entry for an interaction list; one not in the index is parsed but not kept."""
+        entry = self._lookup(_entry_key(interactions_data))
+        return entry if entry is not None else self._build_entry(interactions_data)
+
+    def _build_entry(self, interactions_data):
+        try:
+            descriptions = parse_interactions(interactions_data)
+        except (ValueError, SyntaxError) as e:
+            entry = _Entry(error=e)
+        else:
+            mentions = {}
+            for position, desc in enumerate(descriptions):
+                for name in self._matcher.find_all(str(desc).lower()):
+                    mentions.setdefault(name, position)
+            entry = _Entry(descriptions, mentions)
+        return entry
+
+    def _first_mention(self, entry, names):
+        positions = []
+        for name in names:
+            if name == '':
+                # An empty name is a substring of every description.
+                if entry.descriptions: positions.append(0)
+            elif name in entry.mentions:
+                positions.append(entry.mentions[name])
+            elif name not in self._names:
+                # Not indexed (a drug outside the dataset): scan for it instead
+                position = next(
+                    (i for i, desc in enumerate(entry.descriptions) if name in str(desc).lower()), None
+                )
+                if position is not None: positions.append(position)
+        return entry.descriptions[min(positions)] if positions else None
+
+    def find(self, drug1_info, drug2_info):
+        """
+        Returns the first description in drug1's list mentioning drug2, else the
+        first in drug2's list mentioning drug1, else None.
+        Raises ValueError/SyntaxError if the interaction data cannot be parsed.
+        """
+        names1 = (str(drug1_info['drug_name']).lower(), str(drug1_info['generic_name']).lower())
+        names2 = (str(drug2_info['drug_name']).lower(), str(drug2_info['generic_name']).lower())
+
+        entry1 = self._entry(drug1_info['drug_interactions'])
+        if entry1.error is not None: raise entry1.error
+        description = self._first_mention(entry1, names2)
+        if description:
+            return description
+
+        entry2 = self._entry(drug2_info['drug_interactions'])
+        if entry2.error is not None: raise entry2.error
+        return self._first_mention(entry2, names1)
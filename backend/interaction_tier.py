@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+
+
+DEFAULT_TIER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "interaction_tier.npz")
+# Verdicts below this confidence are escalated to the zero-shot model.
+CONFIDENCE_THRESHOLD = float(os.environ.get("INTERACTION_TIER_THRESHOLD", "0.9"))
+HASH_BITS = 18
+TIER_FORMAT_VERSION = 1
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def feature_indices(text, bits=HASH_BITS):
+    """
+    Hashed word unigrams and bigrams of a description. CRC32 rather than hash(),
+    so indices are the same in every process and across restarts.
+    """
+    words = _WORD.findall(str(text).lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    mask = (1 << bits) - 1
+    return sorted({zlib.crc32(gram.encode("utf-8")) & mask for gram in grams})
+
+
+def feature_matrix(texts, bits=HASH_BITS):
+    """Binary hashed n-gram features of many descriptions, as a sparse matrix."""
+    from scipy.sparse import csr_matrix
+
+    indptr, indices = [0], []
+    for text in texts:
+        indices += feature_indices(text, bits)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, 1 << bits))
+
+
+class InteractionTier:
+    """
+    Fast first tier of the interaction risk classifier.
+
+    A logistic regression over hashed n-grams, distilled from the zero-shot
+    model's own verdicts on the formulary's interaction descriptions (which are
+    formulaic DrugBank sentences). It labels a description in microseconds;
+    callers escalate verdicts below `threshold` confidence to the zero-shot model.
+    Keeps counts of how often each tier answered and how often the two agree.
+    """
+
+    def __init__(self, weights, bias, labels, metadata=None, threshold=CONFIDENCE_THRESHOLD):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.labels = list(labels)
+        self.metadata = metadata or {}
+        self.threshold = threshold
+        self.bits = int(self.metadata.get('hash_bits', HASH_BITS))
+        self.fingerprint = hashlib.sha256(
+            self.weights.tobytes() + json.dumps([self.bias, self.labels, threshold]).encode("utf-8")
+        ).hexdigest()[:16]
+
+        self._lock = threading.Lock()
+        self.fast_answers = 0
+        self.escalations = 0
+        self.compared = 0
+        self.agreed = 0
+        self._compared_texts = set()
+
+    def predict(self, texts):
+        """Returns [(label, confidence), ...] for the texts: labels[0] vs labels[1]."""
+        verdicts = []
+        for text in texts:
+            margin = self.bias + float(self.weights[feature_indices(text, self.bits)].sum())
+            p_first = 1.0 / (1.0 + math.exp(-margin))
+            verdicts.append((self.labels[0], p_first) if p_first >= 0.5 else (self.labels[1], 1.0 - p_first))
+        return verdicts
+
+    def record_usage(self, fast_answers, escalations):
+        with self._lock:
+            self.fast_answers += fast_answers
+            self.escalations += escalations
+
+    def unchecked(self, texts):
+        """The texts whose zero-shot verdict hasn't been compared with this tier yet."""
+        return [text for text in texts if text not in self._compared_texts]
+
+    def record_agreement(self, guesses, verdicts):
+        """
+        Compares this tier's {text: label} guesses with zero-shot {text: label}
+        verdicts. Each text counts once, however often it is looked up.
+        """
+        with self._lock:
+            for text, label in verdicts.items():
+                if text in guesses and text not in self._compared_texts:
+                    self._compared_texts.add(text)
+                    self.compared += 1
+                    self.agreed += guesses[text] == label
+
+    def stats(self):
+        answered = self.fast_answers + self.escalations
+        return {
+            "fingerprint": self.fingerprint,
+            "threshold": self.threshold,
+            "fast_answers": self.fast_answers,
+            "escalations": self.escalations,
+            "fast_share": self.fast_answers / answered if answered else 0.0,
+            "compared": self.compared,
+            "agreement_rate": self.agreed / self.compared if self.compared else None,
+            "holdout_agreement": self.metadata.get('holdout_agreement'),
+        }
+
+    def save(self, path=DEFAULT_TIER_PATH):
+        """Writes the tier to a temp file and renames it, so readers never see a partial file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd, staging = tempfile.mkstemp(prefix='.staging-', suffix='.npz', dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, weights=self.weights, bias=np.float64(self.bias),
+                         metadata=np.array(json.dumps({**self.metadata, 'labels': self.labels})))
+            os.replace(staging, path)
+        except Exception:
+            if os.path.exists(staging):
+                os.unlink(staging)
+            raise
+        return path
+
+    @classmethod
+    def load(cls, path, teacher_model_id, labels, threshold=CONFIDENCE_THRESHOLD):
+        """
+        Loads a saved tier, or returns None if there is none or it was distilled
+        from a different zero-shot model or label set.
+        """
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as saved:
+                metadata = json.loads(str(saved['metadata']))
+                weights, bias = saved['weights'], float(saved['bias'])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Could not load interaction tier '{path}': {e}")
+            return None
+        if metadata.get('format_version') != TIER_FORMAT_VERSION or metadata.get('teacher') != teacher_model_id \
+                or metadata.get('labels') != list(labels):
+            print(f"ℹ️ Interaction tier '{path}' was distilled from another NLP model or label set, ignoring it.")
+            return None
+        return cls(weights, bias, labels, metadata, threshold)
+
+
+def train_tier(texts, verdicts, teacher_model_id, labels, threshold=CONFIDENCE_THRESHOLD,
+               holdout=0.2, seed=42, bits=HASH_BITS):
+    """
+    Distills a tier from zero-shot verdicts ({text: label}) on `texts`.
+
+    Agreement with the zero-shot model is measured on a held-out share of the
+    texts, then the tier is refit on all of them. Raises ValueError if the
+    verdicts don't include both labels.
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+
+    texts = list(dict.fromkeys(texts))
+    y = np.array([verdicts[text] == labels[0] for text in texts], dtype=np.int8)
+    if len(np.unique(y)) < 2:
+        raise ValueError("the zero-shot verdicts contain only one label, nothing to learn")
+
+    def fit(sample_texts, sample_y):
+        model = LogisticRegression(C=10.0, solver='liblinear')
+        model.fit(feature_matrix(sample_texts, bits), sample_y)
+        return InteractionTier(model.coef_[0], model.intercept_[0], labels, {'hash_bits': bits}, threshold)
+
+    metadata = {
+        'format_version': TIER_FORMAT_VERSION,
+        'teacher': teacher_model_id,
+        'hash_bits': bits,
+        'train_texts': len(texts),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+    can_hold_out = min(np.bincount(y)) >= 2 and int(len(texts) * holdout) >= 2
+    if can_hold_out:
+        train_texts, test_texts, train_y, test_y = train_test_split(
+            texts, y, test_size=holdout, random_state=seed, stratify=y
+        )
+        predicted = fit(train_texts, train_y).predict(test_texts)
+        expected = [labels[0] if value else labels[1] for value in test_y]
+        agree = np.array([label == want for (label, _), want in zip(predicted, expected)])
+        confident = np.array([confidence >= threshold for _, confidence in predicted])
+        metadata.update({
+            'holdout_texts': len(test_texts),
+            'holdout_agreement': float(agree.mean()),
+            'holdout_coverage': float(confident.mean()),
+            'holdout_confident_agreement': float(agree[confident].mean()) if confident.any() else None,
+        })
+
+    tier = fit(texts, y)
+    tier.metadata = metadata
+    return tier
+
+
+def corpus_descriptions(df):
+    """Every distinct interaction description in the dataset's interaction lists."""
+    from interaction_index import parse_interactions
+
+    descriptions = []
+    for interactions_data in df['drug_interactions'].unique():
+        try:
+            descriptions += [str(desc) for desc in parse_interactions(interactions_data)]
+        except (ValueError, SyntaxError):
+            continue
+    return list(dict.fromkeys(desc for desc in descriptions if desc and desc != 'nan'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the fast interaction risk tier from the zero-shot model.")
+    parser.add_argument('--data', default='data/testtt01.csv', help="path to the drug dataset CSV")
+    parser.add_argument('--out', default=os.environ.get("INTERACTION_TIER_PATH", DEFAULT_TIER_PATH),
+                        help="tier file to write")
+    parser.add_argument('--threshold', type=float, default=CONFIDENCE_THRESHOLD,
+                        help="confidence below which verdicts escalate to the zero-shot model")
+    args = parser.parse_args()
+
+    import app as recommender
+
+    df = recommender.load_and_clean_data(args.data)
+    if df is None:
+        raise SystemExit(1)
+    if recommender.get_nlp_classifier() is None:
+        print("❌ The zero-shot model is needed to label the corpus.")
+        raise SystemExit(1)
+
+    texts = corpus_descriptions(df)
+    print(f"Labelling {len(texts)} interaction descriptions with {recommender.NLP_MODEL_ID}...")
+    verdicts = recommender.classify_interactions(texts, use_fast_tier=False)
+    try:
+        tier = train_tier(texts, verdicts, recommender.NLP_MODEL_ID, recommender.CANDIDATE_LABELS, args.threshold)
+    except ValueError as e:
+        print(f"❌ Could not train the interaction tier: {e}")
+        raise SystemExit(1)
+
+    path = tier.save(args.out)
+    summary = {key: tier.metadata.get(key) for key in ('train_texts', 'holdout_agreement', 'holdout_coverage',
+                                                       'holdout_confident_agreement')}
+    print(f"✅ Interaction tier {tier.fingerprint} saved to '{path}': {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+
+
+# Off: timers and counters become no-ops unless a request asked for its timing breakdown.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000, 100000)
+
+# Stage -> seconds for the current request, when it asked for a breakdown; else None.
+_breakdown = contextvars.ContextVar("timing_breakdown", default=None)
+
+
+class Histogram:
+    """Prometheus-style histogram with fixed buckets, one series per label value."""
+
+    def __init__(self, name, help_text, label, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # label value -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_value, values in sorted(series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {values[-1]}')
+            lines.append(f"{self.name}_sum{{{label}}} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {values[-1]}")
+        return lines
+
+
+class Counter:
+    """Prometheus-style counter, one series per label value."""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_value, value in sorted(values.items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+stage_seconds = Histogram(
+    "pbm_stage_seconds", "Time spent in each hot-path stage.", "stage", SECONDS_BUCKETS
+)
+request_seconds = Histogram(
+    "pbm_request_seconds", "Time to produce a response, per endpoint (streamed bodies excluded).",
+    "endpoint", SECONDS_BUCKETS
+)
+sizes = Histogram(
+    "pbm_batch_size", "Sizes of the batches the hot paths work on (NLP batches, candidate sets).",
+    "kind", SIZE_BUCKETS
+)
+events = Counter("pbm_events_total", "Counts of hot-path events (NLP calls, recommendation table hits and misses).", "event")
+REGISTRY = [stage_seconds, request_seconds, sizes, events]
+
+
+class _Timer:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(stage):
+    """Context manager timing a stage into pbm_stage_seconds and the request breakdown."""
+    if not METRICS_ENABLED and _breakdown.get() is None:
+        return _NULL_TIMER
+    return _Timer(stage)
+
+
+def record(stage, seconds):
+    if METRICS_ENABLED:
+        stage_seconds.observe(stage, seconds)
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown[stage] = breakdown.get(stage, 0.0) + seconds
+
+
+def observe_size(kind, value):
+    if METRICS_ENABLED:
+        sizes.observe(kind, value)
+
+
+def count(event, amount=1):
+    if METRICS_ENABLED and amount:
+        events.inc(event, amount)
+
+
+def start_breakdown():
+    """Collects this request's stage timings, for a timing header on its response."""
+    _breakdown.set({})
+
+
+def take_breakdown():
+    """Returns and clears the current request's stage timings (None if not requested)."""
+    breakdown = _breakdown.get()
+    _breakdown.set(None)
+    return breakdown
+
+
+def server_timing_header(breakdown, total=None):
+    """Formats stage timings as a Server-Timing header value (milliseconds)."""
+    parts = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in breakdown.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(parts)
+
+
+def render(extra_lines=()):
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += list(extra_lines)
+    return "\n".join(lines) + "\n"
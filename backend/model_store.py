@@ -0,0 +1,168 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+import lightgbm as lgb
+
+import app as recommender
+
+
+ARTIFACT_FORMAT_VERSION = 1
+DEFAULT_ARTIFACT_DIR = os.environ.get(
+    "MODEL_ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+)
+
+
+def dataset_fingerprint(df):
+    """
+    Fingerprints the cleaned dataset together with everything else that shapes
+    the trained model: scoring code version, feature schema and NLP setup.
+    Whether the zero-shot model can be loaded is left out: it is only known once
+    something asks for a verdict, which a warm start never does.
+    """
+    setup = {
+        'artifact_format': ARTIFACT_FORMAT_VERSION,
+        'scoring_version': recommender.SCORING_VERSION,
+        'features': recommender.FEATURES,
+        'nlp_model': recommender.NLP_MODEL_ID,
+        'nlp_labels': recommender.CANDIDATE_LABELS,
+        'columns': [str(col) for col in df.columns],
+    }
+    if recommender.interaction_tier is not None:
+        # The fast tier labels part of the training pairs in place of the zero-shot model.
+        setup['nlp_tier'] = recommender.interaction_tier.fingerprint
+    digest = hashlib.sha256()
+    digest.update(json.dumps(setup, sort_keys=True).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def artifact_path(fingerprint, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    return os.path.join(artifact_dir, fingerprint[:16])
+
+
+def artifact_metadata(metrics, fingerprint):
+    return {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'fingerprint': fingerprint,
+        'scoring_version': recommender.SCORING_VERSION,
+        'features': recommender.FEATURES,
+        'metrics': metrics,
+        # 'degraded' means descriptions without a cached or fast-tier verdict scored no risk
+        'nlp_status': recommender.nlp_status(),
+        'lightgbm_version': lgb.__version__,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def save_artifact(model, metrics, fingerprint, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """
+    Writes the booster, feature schema and validation metrics as a versioned artifact.
+    The directory is written to a temp location and renamed, so readers never see a partial artifact.
+    """
+    booster = model.booster_ if hasattr(model, 'booster_') else model
+    metadata = artifact_metadata(metrics, fingerprint)
+
+    os.makedirs(artifact_dir, exist_ok=True)
+    target = artifact_path(fingerprint, artifact_dir)
+    staging = tempfile.mkdtemp(prefix='.staging-', dir=artifact_dir)
+    try:
+        booster.save_model(os.path.join(staging, 'booster.txt'))
+        with open(os.path.join(staging, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f, indent=2)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        os.replace(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    print(f"✅ Model artifact saved to '{target}'.")
+    return target
+
+
+def load_artifact(fingerprint, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """
+    Returns (booster, metadata) for a matching artifact, or None if there is none,
+    it was built for a different fingerprint or feature schema, or it was trained
+    while the zero-shot model was unavailable.
+    """
+    target = artifact_path(fingerprint, artifact_dir)
+    try:
+        with open(os.path.join(target, 'metadata.json')) as f:
+            metadata = json.load(f)
+        if metadata.get('fingerprint') != fingerprint or metadata.get('features') != recommender.FEATURES:
+            return None
+        if metadata.get('nlp_status') == 'degraded':
+            return None
+        booster = lgb.Booster(model_file=os.path.join(target, 'booster.txt'))
+    except (OSError, ValueError, lgb.basic.LightGBMError):
+        return None
+    return booster, metadata
+
+
+def build_model(df, artifact_dir=DEFAULT_ARTIFACT_DIR, fingerprint=None):
+    """
+    Trains a model from the cleaned dataset and saves it as an artifact.
+    Returns (booster, metadata), or None if no training data could be generated.
+    A model trained without the zero-shot model is returned but not saved, so the
+    next start trains again instead of warm-starting it.
+    """
+    fingerprint = fingerprint or dataset_fingerprint(df)
+    training_df = recommender.create_training_data(df)
+    if training_df is None:
+        return None
+
+    model, metrics = recommender.train_ml_model(training_df, return_metrics=True)
+    if recommender.nlp_status() == 'degraded':
+        print("⚠️ NLP model unavailable during training: interaction risks are incomplete, so the model is not saved.")
+        return model.booster_, artifact_metadata(metrics, fingerprint)
+    target = save_artifact(model, metrics, fingerprint, artifact_dir)
+    with open(os.path.join(target, 'metadata.json')) as f:
+        metadata = json.load(f)
+    return model.booster_, metadata
+
+
+def load_or_build_model(df, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """
+    Warm start: loads the artifact matching the dataset fingerprint, and only
+    regenerates training data and retrains when there is none.
+    """
+    fingerprint = dataset_fingerprint(df)
+    loaded = load_artifact(fingerprint, artifact_dir)
+    if loaded is not None:
+        print(f"✅ Loaded model artifact {fingerprint[:16]} (validation RMSE: {loaded[1]['metrics']['rmse']:.2f}).")
+        return loaded
+
+    print(f"ℹ️ No model artifact for dataset fingerprint {fingerprint[:16]}, training a new model.")
+    return build_model(df, artifact_dir, fingerprint)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a model artifact offline from a drug dataset CSV.")
+    parser.add_argument('--data', default='data/testtt01.csv', help="path to the drug dataset CSV")
+    parser.add_argument('--out', default=DEFAULT_ARTIFACT_DIR, help="artifact directory")
+    parser.add_argument('--force', action='store_true', help="retrain even if a matching artifact exists")
+    args = parser.parse_args()
+
+    df = recommender.load_and_clean_data(args.data)
+    if df is None:
+        raise SystemExit(1)
+
+    fingerprint = dataset_fingerprint(df)
+    if not args.force and load_artifact(fingerprint, args.out) is not None:
+        print(f"✅ Artifact {fingerprint[:16]} is already up to date in '{args.out}'.")
+        return
+
+    built = build_model(df, args.out, fingerprint)
+    if built is None or built[1]['nlp_status'] == 'degraded':
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
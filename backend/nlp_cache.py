@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "nlp_verdicts.sqlite3")
+
+
+class VerdictCache:
+    """
+    Two-level cache for zero-shot classification verdicts.
+
+    An in-process LRU sits in front of a SQLite store on disk. Entries are keyed
+    by a SHA-256 of the description text plus a namespace derived from the model
+    id and candidate labels, so changing either one invalidates the cache.
+    """
+
+    def __init__(self, model_id, labels, path=DEFAULT_CACHE_PATH, memory_size=4096, disk_size=200_000):
+        self.model_id = model_id
+        self.labels = list(labels)
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.namespace = hashlib.sha256(
+            json.dumps({"model": model_id, "labels": self.labels}).encode("utf-8")
+        ).hexdigest()
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        # Upper bound on the rows on disk: a replaced verdict is counted as a new row
+        self._disk_rows = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            try:
+                self._conn = self._open(path)
+            except sqlite3.Error as e:
+                print(f"⚠️ NLP verdict cache is memory-only, could not open '{path}': {e}")
+                self._conn = None
+        _open_caches.add(self)
+
+    def _reopen_after_fork(self):
+        # SQLite connections must not be shared across fork; the child opens its own.
+        self._lock = threading.Lock()
+        if self._conn is not None:
+            try:
+                self._conn = self._open(self.path)
+            except sqlite3.Error:
+                self._conn = None
+
+    def _open(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            "key TEXT PRIMARY KEY, label TEXT NOT NULL, score REAL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+
+        row = conn.execute("SELECT value FROM meta WHERE key = 'namespace'").fetchone()
+        if row is None or row[0] != self.namespace:
+            # Model or label set changed: every stored verdict is stale.
+            if row is not None:
+                print("ℹ️ NLP model or labels changed, invalidating cached verdicts.")
+            conn.execute("DELETE FROM verdicts")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('namespace', ?)", (self.namespace,))
+        conn.commit()
+        self._disk_rows = conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        return conn
+
+    def key(self, text):
+        """Content address of a description under the current model and labels."""
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, label):
+        self._memory[key] = label
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, texts):
+        """
+        Returns {text: label} for every text that has a cached verdict.
+        """
+        found = {}
+        pending = {}
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                label = self._memory.get(key)
+                if label is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    found[text] = label
+                else:
+                    pending[key] = text
+
+            if pending and self._conn is not None:
+                keys = list(pending)
+                now = time.time()
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    marks = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        f"SELECT key, label FROM verdicts WHERE key IN ({marks})", chunk
+                    ).fetchall()
+                    for key, label in rows:
+                        found[pending.pop(key)] = label
+                        self._remember(key, label)
+                        self.disk_hits += 1
+                    if rows:
+                        self._conn.executemany(
+                            "UPDATE verdicts SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                        )
+                self._conn.commit()
+
+            self.misses += len(pending)
+        return found
+
+    def get(self, text):
+        return self.get_many([text]).get(text)
+
+    def put_many(self, verdicts):
+        """
+        Stores {text: label} or {text: (label, score)} verdicts in both levels.
+        """
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, verdict in verdicts.items():
+                label, score = verdict if isinstance(verdict, tuple) else (verdict, None)
+                key = self.key(text)
+                self._remember(key, label)
+                rows.append((key, label, score, now))
+
+            if rows and self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO verdicts (key, label, score, last_used) VALUES (?, ?, ?, ?)", rows
+                )
+                self._disk_rows += len(rows)
+                if self._disk_rows > self.disk_size:
+                    self._evict_disk()
+                self._conn.commit()
+
+    def put(self, text, label, score=None):
+        self.put_many({text: (label, score)})
+
+    def _evict_disk(self):
+        # The running count may be high (replaced rows, or low if other processes share
+        # the file), so recount before trimming; this only runs once it passes the bound.
+        count = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        self._disk_rows = count
+        if count <= self.disk_size:
+            return
+        # Trim to 90% of the bound so eviction doesn't run on every insert.
+        excess = count - int(self.disk_size * 0.9)
+        self._conn.execute(
+            "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY last_used LIMIT ?)", (excess,)
+        )
+        self._disk_rows = count - excess
+        self.evictions += excess
+
+    def memory_entries(self):
+        """(key, label) pairs held in memory, least recently used first."""
+        with self._lock:
+            return list(self._memory.items())
+
+    def merge_memory_entries(self, entries):
+        """Adds (key, label) pairs computed elsewhere, e.g. in forked workers, to the memory level."""
+        with self._lock:
+            for key, label in entries:
+                self._remember(key, label)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM verdicts")
+                self._conn.commit()
+                self._disk_rows = 0
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "persistent": self._conn is not None,
+        }
+
+
+_open_caches = weakref.WeakSet()
+
+
+def _reopen_caches_in_child():
+    for cache in list(_open_caches):
+        cache._reopen_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reopen_caches_in_child)
@@ -0,0 +1,264 @@
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+from werkzeug.serving import make_server
+
+
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", str(os.cpu_count() or 1)))
+# How often the supervisor checks for a new dataset or model artifact.
+RELOAD_POLL_SECONDS = float(os.environ.get("RELOAD_POLL_SECONDS", "5"))
+# How long a retiring worker may spend finishing in-flight requests.
+GRACEFUL_TIMEOUT = float(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+# Workers dying unexpectedly more than this many times within RESTART_WINDOW seconds
+# (e.g. worker_init failing on every start) shut the supervisor down instead of looping.
+MAX_RESTARTS = int(os.environ.get("WORKER_MAX_RESTARTS", "10"))
+RESTART_WINDOW = float(os.environ.get("WORKER_RESTART_WINDOW", "60"))
+# Replacements wait this long, doubling with each recent crash, up to MAX_RESTART_DELAY.
+RESTART_DELAY = 0.5
+MAX_RESTART_DELAY = 30.0
+
+
+def _listen(host, port):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock, host, port, worker_init):
+    """Child process body: serve on the shared socket until SIGTERM, then drain and exit."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when workers stop
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    status = 0
+    try:
+        if worker_init is not None:
+            worker_init()
+        server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+        # Non-daemon request threads, so server_close() waits for in-flight requests.
+        server.daemon_threads = False
+
+        def stop(signum, frame):
+            # shutdown() blocks until serve_forever returns, so it can't run on this thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        server.serve_forever()
+        server.server_close()
+    except Exception as e:
+        print(f"❌ Worker {os.getpid()} failed: {e}", file=sys.stderr)
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+class PreforkServer:
+    """
+    Serves a WSGI app from N forked worker processes sharing one listening socket.
+
+    `load()` runs in the supervisor before forking, so the dataset, model and
+    indexes it builds are shared by every worker copy-on-write instead of being
+    loaded N times. When `signature()` changes (or on SIGHUP) the supervisor
+    loads again, forks a new generation of workers and retires the old ones
+    gracefully; if the load fails, the current workers keep serving.
+
+    Workers that exit unexpectedly are replaced after a delay that doubles with
+    each recent crash. Past `max_restarts` crashes within `restart_window`
+    seconds the supervisor gives up and stops, rather than fork-looping.
+    """
+
+    def __init__(self, app, load, host='0.0.0.0', port=5000, workers=SERVE_WORKERS,
+                 signature=None, worker_init=None, poll_interval=RELOAD_POLL_SECONDS,
+                 graceful_timeout=GRACEFUL_TIMEOUT, max_restarts=MAX_RESTARTS, restart_window=RESTART_WINDOW):
+        self.app = app
+        self.load = load
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.signature = signature
+        self.worker_init = worker_init
+        self.poll_interval = poll_interval
+        self.graceful_timeout = graceful_timeout
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.generation = 0
+        self._sock = None
+        self._pids = set()
+        self._retiring = {}  # pid -> deadline for SIGKILL
+        self._stopping = False
+        self._failed = False
+        self._reload_requested = False
+        self._crashes = deque()  # monotonic times of recent unexpected exits
+        self._respawn_at = []  # monotonic times replacements are due
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(self.app, self._sock, self.host, self.port, self.worker_init)
+        self._pids.add(pid)
+        return pid
+
+    def _retire(self, pids):
+        deadline = time.monotonic() + self.graceful_timeout
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                self._retiring[pid] = deadline
+            except ProcessLookupError:
+                pass
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self._retiring.pop(pid, None)
+            if pid in self._pids:
+                self._pids.discard(pid)
+                if not self._stopping:
+                    self._on_crash(pid, status)
+
+        now = time.monotonic()
+        due = [at for at in self._respawn_at if at <= now]
+        if due and not self._stopping:
+            self._respawn_at = [at for at in self._respawn_at if at > now]
+            for _ in due:
+                self._spawn()
+
+        # Workers that outlived the graceful timeout are killed.
+        for pid, deadline in list(self._retiring.items()):
+            if now >= deadline:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    self._retiring.pop(pid, None)
+
+    def _on_crash(self, pid, status):
+        now = time.monotonic()
+        self._crashes.append(now)
+        while self._crashes and self._crashes[0] < now - self.restart_window:
+            self._crashes.popleft()
+        if len(self._crashes) > self.max_restarts:
+            print(f"❌ Workers exited {len(self._crashes)} times in {self.restart_window:g}s "
+                  f"(last: {pid}, status {status}), shutting down.", file=sys.stderr)
+            self._failed = True
+            self._stopping = True
+            return
+        delay = min(MAX_RESTART_DELAY, RESTART_DELAY * 2 ** (len(self._crashes) - 1))
+        print(f"⚠️ Worker {pid} exited unexpectedly (status {status}), starting a replacement in {delay:g}s.")
+        self._respawn_at.append(now + delay)
+
+    def _load(self):
+        loaded = self.load()
+        return loaded, self.signature() if self.signature is not None else None
+
+    def reload(self):
+        print("🔄 Reloading dataset and model for a new worker generation...")
+        loaded, signature = self._load()
+        if not loaded:
+            print("❌ Reload failed, the current workers keep serving.")
+            return signature
+        old = set(self._pids)
+        self._pids.clear()
+        self._respawn_at.clear()  # the new generation replaces them
+        self.generation += 1
+        for _ in range(self.workers):
+            self._spawn()
+        self._retire(old)
+        print(f"✅ Generation {self.generation}: {self.workers} worker(s) started, {len(old)} retiring.")
+        return signature
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def run(self):
+        loaded, last_signature = self._load()
+        if not loaded:
+            print("❌ Initial load failed, not starting workers.")
+            return False
+
+        self._sock = _listen(self.host, self.port)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        for _ in range(self.workers):
+            self._spawn()
+        print(f"🚀 Serving on http://{self.host}:{self.port} with {self.workers} worker process(es).")
+
+        next_poll = time.monotonic() + self.poll_interval
+        try:
+            while not self._stopping:
+                time.sleep(0.2)
+                self._reap()
+                changed = False
+                if self.signature is not None and time.monotonic() >= next_poll:
+                    next_poll = time.monotonic() + self.poll_interval
+                    changed = self.signature() != last_signature
+                if (changed or self._reload_requested) and not self._stopping:
+                    self._reload_requested = False
+                    last_signature = self.reload()
+        finally:
+            print("🛑 Stopping workers...")
+            self._retire(set(self._pids))
+            self._pids.clear()
+            self._respawn_at.clear()
+            while self._retiring:
+                time.sleep(0.2)
+                self._reap()
+            self._sock.close()
+        return not self._failed
+
+
+def _prepare_worker():
+    import server
+    from batch_recommend import _init_worker
+
+    _init_worker()
+    # Each worker is already one of N processes; batches are scored inline.
+    server.batch_recommender.workers = 1
+    server.ingest_enabled = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the PBM API from pre-forked worker processes.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    import server
+    from app import get_nlp_classifier
+
+    def load():
+        if not server.initialize_model(background=False):
+            return False
+        # Finish loading BART in the supervisor so workers inherit it instead of each loading a copy.
+        get_nlp_classifier()
+        return True
+
+    supervisor = PreforkServer(
+        server.app, load, host=args.host, port=args.port, workers=args.workers,
+        signature=server.serving_signature, worker_init=_prepare_worker
+    )
+    if not supervisor.run():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from app import FEATURES, score_interaction_risks
+
+
+DEFAULT_TOP_K = int(os.environ.get("RECOMMENDATION_TOP_K", "5"))
+# Upper bound on feature rows sent to a single model.predict call while building.
+PREDICT_CHUNK_ROWS = 250_000
+
+
+def recommendation_key(drug):
+    """
+    Everything the single-drug recommendation depends on. drug_name and NDC are
+    not unique in the formulary, so the key includes the scoring inputs as well.
+    """
+    return (drug['drug_name'], drug['generic_name'], drug['therapeutic_class'], float(drug['pmpm_cost']))
+
+
+class RecommendationTable:
+    """
+    Ranked top-k ML alternatives for every drug, precomputed at model-load time.
+
+    Single-drug recommendations become a dictionary lookup. Only the affected
+    therapeutic classes are re-scored when the catalog changes (see with_classes),
+    always with the model the table was built with, so every entry ranks by the
+    same model until the table is rebuilt.
+    """
+
+    def __init__(self, model, catalog, top_k=DEFAULT_TOP_K, interactions=None):
+        self.model = model
+        self.catalog = catalog
+        self.interactions = interactions
+        self.top_k = top_k
+        self._ranked = {}
+        self._class_keys = {}
+        self.build()
+
+    def build(self):
+        self._ranked.clear()
+        self._class_keys.clear()
+        for t_class, _ in self.catalog.classes():
+            self._score_class(t_class)
+        print(f"✅ Recommendation table built for {len(self._ranked)} drugs.")
+
+    def with_classes(self, catalog, classes, interactions=None):
+        """
+        A new table for an updated catalog and interaction index, with `classes`
+        re-scored by this table's model. Entries of the other classes are shared;
+        this table is left as it is.
+        """
+        table = RecommendationTable.__new__(RecommendationTable)
+        table.model = self.model
+        table.catalog = catalog
+        table.interactions = interactions if interactions is not None else self.interactions
+        table.top_k = self.top_k
+        table._ranked = dict(self._ranked)
+        table._class_keys = dict(self._class_keys)
+        for t_class in classes:
+            table.rebuild_class(t_class)
+        return table
+
+    def rebuild_class(self, t_class):
+        """Re-scores a single therapeutic class after its rows changed in the catalog."""
+        for key in self._class_keys.pop(t_class, ()):
+            self._ranked.pop(key, None)
+        self._score_class(t_class)
+
+    def _score_class(self, t_class):
+        catalog = self.catalog
+        members = catalog.class_positions(t_class)
+        records = catalog.records(members)
+        names = catalog.codes['drug_name'][members]
+        generic_names = catalog.codes['generic_name'][members]
+        is_equivalent = catalog.is_equivalent[members]
+        costs = catalog.costs[members]
+
+        # Drugs with TE code 'NA' are never replaced, so they get no entry.
+        originals = np.flatnonzero(is_equivalent == 1)
+        keys = self._class_keys.setdefault(t_class, [])
+        class_size = len(records)
+        originals_per_chunk = max(1, PREDICT_CHUNK_ROWS // max(class_size, 1))
+
+        for start in range(0, len(originals), originals_per_chunk):
+            chunk = originals[start:start + originals_per_chunk]
+            orig_positions = np.repeat(chunk, class_size)
+            cand_positions = np.tile(np.arange(class_size), len(chunk))
+            keep = names[orig_positions] != names[cand_positions]
+            orig_positions, cand_positions = orig_positions[keep], cand_positions[keep]
+
+            # Interaction risk between each drug and its replacement, as in recommend_with_ml.
+            interaction_risk = score_interaction_risks(
+                [(records[orig], records[cand]) for orig, cand in zip(orig_positions, cand_positions)],
+                interactions=self.interactions
+            ) if len(orig_positions) else []
+            features = pd.DataFrame({
+                'is_same_generic': (generic_names[orig_positions] == generic_names[cand_positions]).astype(np.int8),
+                'is_equivalent': is_equivalent[cand_positions],
+                'cost_difference': costs[orig_positions] - costs[cand_positions],
+                'interaction_risk': np.asarray(interaction_risk, dtype=np.int8)
+            })
+            scores = self.model.predict(features[FEATURES]) if len(features) else np.empty(0)
+
+            bounds = np.searchsorted(orig_positions, chunk)
+            ends = np.append(bounds[1:], len(orig_positions))
+            for orig, lo, hi in zip(chunk, bounds, ends):
+                order = np.argsort(-scores[lo:hi], kind='stable')[:self.top_k]
+                key = recommendation_key(records[orig])
+                self._ranked[key] = [(records[cand_positions[lo + i]], float(scores[lo + i])) for i in order]
+                keys.append(key)
+
+    def get(self, drug):
+        """
+        Returns [(alternative record, predicted score), ...] best first, or None
+        if the drug is not in the table.
+        """
+        try:
+            return self._ranked.get(recommendation_key(drug))
+        except (TypeError, ValueError):
+            return None
+
+    def __len__(self):
+        return len(self._ranked)
@@ -0,0 +1,163 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import FEATURES, candidate_feature_frame, score_interaction_risks
+from drug_catalog import as_catalog
+import metrics
+
+
+BEAM_WIDTH = int(os.environ.get("REGIMEN_BEAM_WIDTH", "64"))
+CANDIDATES_PER_SLOT = int(os.environ.get("REGIMEN_CANDIDATES_PER_SLOT", "25"))
+TIME_BUDGET = float(os.environ.get("REGIMEN_TIME_BUDGET", "0.5"))
+# Pairs above this interaction risk are never part of a proposed regimen (2 = high risk).
+MAX_PAIR_RISK = 1
+RISK_LEVELS = 3
+
+
+class _State:
+    __slots__ = ("choice", "risks", "score", "bound")
+
+    def __init__(self, choice, risks, score, bound):
+        self.choice = choice  # candidate index per searched slot
+        self.risks = risks    # worst interaction risk per searched slot so far
+        self.score = score
+        self.bound = bound
+
+
+def _slot_candidates(original_drug, catalog):
+    """
+    Returns (candidate row positions, base feature frame) for one slot. Positions
+    are None for a drug with TE code 'NA', whose only candidate is itself.
+    """
+    if original_drug['therapeutic_equivalence_code'] == 'NA':
+        return None, candidate_feature_frame(original_drug, pd.DataFrame([original_drug]))
+    positions = catalog.class_positions(original_drug['therapeutic_class'])
+    return positions, catalog.feature_frame(original_drug, positions)
+
+
+def _slot_scores(model, slot_features):
+    """
+    Predicts every candidate's score at each interaction risk level with one
+    model.predict call. Returns one (n_candidates, RISK_LEVELS) array per slot,
+    made non-increasing in risk so partial scores are safe upper bounds.
+    """
+    feature_frames = []
+    for base in slot_features:
+        feature_frames += [base.assign(interaction_risk=np.int8(risk)) for risk in range(RISK_LEVELS)]
+    feature_matrix = pd.concat(feature_frames, ignore_index=True)[FEATURES]
+    with metrics.timer('predict'):
+        predictions = model.predict(feature_matrix)
+
+    slot_scores, offset = [], 0
+    for base in slot_features:
+        n = len(base)
+        scores = predictions[offset:offset + n * RISK_LEVELS].reshape(RISK_LEVELS, n).T
+        slot_scores.append(np.minimum.accumulate(scores, axis=1))
+        offset += n * RISK_LEVELS
+    return slot_scores
+
+
+def optimize_regimen(model, original_drugs, catalog, top_k=3, beam_width=BEAM_WIDTH,
+                     candidates_per_slot=CANDIDATES_PER_SLOT, max_pair_risk=MAX_PAIR_RISK, time_budget=TIME_BUDGET,
+                     interactions=None):
+    """
+    Finds the highest-scoring substitutions for a regimen of any number of drugs.
+
+    Beam search over slots. Partial regimens are ranked by an upper bound (current
+    score plus the best possible score of the remaining slots; scores only drop as
+    interaction risk rises), and extensions with a pairwise interaction risk above
+    `max_pair_risk` are pruned (if that leaves nothing, the search reruns without the filter).
+    Once `time_budget` seconds have passed the beam narrows to a greedy completion.
+
+    Returns up to top_k dicts, best first: {'drugs', 'score', 'max_interaction_risk'},
+    with 'drugs' in the same order as `original_drugs`.
+    `catalog` is a DrugCatalog (a plain DataFrame is indexed on the spot) and
+    `interactions` the InteractionIndex matching it (default: the loaded one).
+    """
+    started = time.perf_counter()
+    if not original_drugs:
+        return []
+
+    catalog = as_catalog(catalog)
+    with metrics.timer('candidates'):
+        slots = [_slot_candidates(drug, catalog) for drug in original_drugs]
+    metrics.observe_size('candidates', sum(len(features) for _, features in slots))
+    slot_scores = _slot_scores(model, [features for _, features in slots])
+
+    # Only the best candidates_per_slot of each slot take part in the search,
+    # so only their records are materialized.
+    slot_records, slot_score_rows = [], []
+    for original_drug, (positions, _), scores in zip(original_drugs, slots, slot_scores):
+        keep = np.argsort(-scores[:, 0], kind='stable')[:candidates_per_slot]
+        slot_records.append([original_drug] if positions is None else catalog.records(positions[keep]))
+        slot_score_rows.append(scores[keep])
+
+    # Slots with fewer options first: they constrain the rest and prune earlier.
+    order = sorted(range(len(original_drugs)), key=lambda slot: len(slot_records[slot]))
+    best_possible = [slot_score_rows[slot][:, 0].max() for slot in order]
+    remaining_bound = np.append(np.cumsum(best_possible[::-1])[::-1], 0.0)
+
+    search_started = time.perf_counter()
+    pair_risks = {}
+    beam = [_State((), (), 0.0, remaining_bound[0])]
+    for depth, slot in enumerate(order):
+        width = beam_width if time.perf_counter() - started < time_budget else 1
+        records = slot_records[slot]
+
+        # Classify every new pair the expansions need in one batched NLP pass.
+        needed = set()
+        for state in beam:
+            for prev_depth, prev_choice in enumerate(state.choice):
+                for cand in range(len(records)):
+                    key = (order[prev_depth], prev_choice, slot, cand)
+                    if key not in pair_risks:
+                        needed.add(key)
+        needed = sorted(needed)
+        risks = score_interaction_risks(
+            [(slot_records[a][i], slot_records[b][j]) for a, i, b, j in needed], interactions=interactions
+        )
+        pair_risks.update(zip(needed, risks))
+
+        expansions = []
+        for state in beam:
+            chosen_names = {slot_records[order[d]][c]['drug_name'] for d, c in enumerate(state.choice)}
+            for cand, record in enumerate(records):
+                if record['drug_name'] in chosen_names:
+                    continue
+                new_risks = list(state.risks)
+                own_risk = 0
+                for prev_depth, prev_choice in enumerate(state.choice):
+                    risk = pair_risks[(order[prev_depth], prev_choice, slot, cand)]
+                    own_risk = max(own_risk, risk)
+                    new_risks[prev_depth] = max(new_risks[prev_depth], risk)
+                if own_risk > max_pair_risk:
+                    continue
+                new_risks.append(own_risk)
+                choice = state.choice + (cand,)
+                score = sum(slot_score_rows[order[d]][c, r] for d, (c, r) in enumerate(zip(choice, new_risks)))
+                expansions.append(_State(choice, tuple(new_risks), score, score + remaining_bound[depth + 1]))
+
+        if not expansions:
+            if max_pair_risk < RISK_LEVELS - 1:
+                # Nothing passes the risk filter: rank by score alone rather than return nothing.
+                return optimize_regimen(model, original_drugs, catalog, top_k, beam_width, candidates_per_slot,
+                                        RISK_LEVELS - 1, max(0.0, time_budget - (time.perf_counter() - started)),
+                                        interactions)
+            return []
+        expansions.sort(key=lambda state: state.bound, reverse=True)
+        if depth + 1 < len(order):
+            beam = expansions[:width]
+        else:
+            beam = expansions[:top_k]
+
+    metrics.record('regimen_search', time.perf_counter() - search_started)
+    regimens = []
+    for state in beam:
+        drugs = [None] * len(original_drugs)
+        for d, cand in enumerate(state.choice):
+            drugs[order[d]] = slot_records[order[d]][cand]
+        regimens.append({'drugs': drugs, 'score': float(state.score), 'max_interaction_risk': int(max(state.risks))})
+    return regimens
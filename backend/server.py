@@ -1,12 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 import pandas as pd
-import numpy as np
-import ast
-import warnings
-from itertools import product
 import os
 import sys
+import json
+import uuid
+import hashlib
+import threading
+import time
 
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -14,103 +15,343 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 # Import your ML model
 from app import (
     load_and_clean_data, 
-    create_training_data, 
-    train_ml_model, 
     recommend_with_ml,
     check_interaction_nlp,
-    nlp_classifier
+    start_nlp_warmup,
+    get_nlp_classifier,
+    nlp_status,
+    verdict_cache,
+    interaction_tier
 )
+from model_store import load_or_build_model, artifact_path, DEFAULT_ARTIFACT_DIR
+from columnar_store import default_columnar_path, MANIFEST_NAME
+from recommendation_table import RecommendationTable
+from drug_catalog import DrugCatalog
+from drug_search import DrugSearchIndex
+from ingest import DrugStore, ingest_drugs, missing_fields
+from aggregates import AggregateStore
+from batch_recommend import BatchRecommender, parse_regimen_csv
+from regimen_optimizer import optimize_regimen, TIME_BUDGET as REGIMEN_TIME_BUDGET
+from snapshot import SnapshotStore
+import app as recommender
+import metrics
 
 app = Flask(__name__)
 CORS(app)
 
-# Global variables to store model and data
-model = None
-df = None
+# Dataset, catalog, search index, aggregates, model and recommendation table, published together.
+# Requests read one snapshot throughout (see current_snapshot); writers publish the next one.
+snapshots = SnapshotStore()
+# Writer-side state: the growable row buffer behind every snapshot's frame
+drug_store = None
+model_state = "idle"  # idle -> loading -> ready | failed
+# Off in pre-fork workers: an insert would only reach the worker that handled it
+ingest_enabled = True
 
-def initialize_model():
-    """Initialize the ML model and load data"""
-    global model, df
+DATASET_PATH = "data/testtt01.csv"
+
+def initialize_model(background=False):
+    """Load data, then the ML model (on a background thread if requested)"""
+    global drug_store
     try:
+        # Start loading the NLP model while the dataset is parsed
+        if os.environ.get("NLP_WARMUP", "1") == "1":
+            start_nlp_warmup()
+
         # Load and clean data
-        filepath = "data/testtt01.csv"
-        df = load_and_clean_data(filepath)
+        df = load_and_clean_data(DATASET_PATH)
         if df is None:
             print("❌ Failed to load dataset")
             return False
         
-        # Create training data and train model
-        training_df = create_training_data(df)
-        if training_df is None:
-            print("❌ Failed to create training data")
-            return False
-        
-        model = train_ml_model(training_df)
+        # Rows live in a growable buffer so runtime inserts don't copy the dataset
+        with snapshots.write_lock:
+            drug_store = DrugStore(df)
+            df = drug_store.frame()
+            # The model comes with the next snapshot, once it is loaded
+            snapshots.update(
+                df=df, catalog=DrugCatalog(df), search=DrugSearchIndex(df),
+                interactions=recommender.interaction_index, aggregates=AggregateStore(df),
+                model=None, model_metadata=None, table=None
+            )
+
+        if background:
+            threading.Thread(target=load_model, name="model-init", daemon=True).start()
+            return True
+        return load_model()
+    except Exception as e:
+        print(f"❌ Error initializing model: {e}")
+        return False
+
+def load_model():
+    """Load or train the ML model for the current dataset"""
+    global model_state
+    model_state = "loading"
+    try:
+        # Inserts wait for the model, so it is built for the rows they are added to
+        with snapshots.write_lock:
+            snapshot = snapshots.current
+            # Load the saved model for this dataset, or train and save one
+            built = load_or_build_model(snapshot.df)
+            if built is None:
+                print("❌ Failed to create training data")
+                model_state = "failed"
+                return False
+
+            model, model_metadata = built
+            table = RecommendationTable(model, snapshot.catalog, interactions=snapshot.interactions)
+            snapshots.publish(snapshot.evolve(model=model, model_metadata=model_metadata, table=table))
+        model_state = "ready"
         print("✅ Model initialized successfully")
         return True
     except Exception as e:
         print(f"❌ Error initializing model: {e}")
+        model_state = "failed"
         return False
 
+def serving_signature():
+    """Changes when the dataset or a model artifact is rewritten; the pre-fork supervisor reloads on change"""
+    paths = [
+        DATASET_PATH,
+        os.path.join(default_columnar_path(DATASET_PATH), MANIFEST_NAME),
+        DEFAULT_ARTIFACT_DIR,
+    ]
+    model_metadata = snapshots.current.model_metadata
+    if model_metadata is not None:
+        paths.append(os.path.join(artifact_path(model_metadata['fingerprint']), 'metadata.json'))
+    stamps = []
+    for path in paths:
+        try:
+            stamps.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+def current_snapshot():
+    """The snapshot this request reads from, taken on first use so every read in it sees one version"""
+    if 'snapshot' not in g:
+        g.snapshot = snapshots.current
+    return g.snapshot
+
+@app.before_request
+def start_request_timing():
+    """Time every request; 'X-Timing-Breakdown: 1' also collects its per-stage timings"""
+    g.request_started = time.perf_counter()
+    if request.headers.get('X-Timing-Breakdown') == '1':
+        metrics.start_breakdown()
+
+@app.after_request
+def finish_request_timing(response):
+    """Record the request duration and, if asked for, send the breakdown as a Server-Timing header"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    if metrics.METRICS_ENABLED:
+        metrics.request_seconds.observe(request.url_rule.rule if request.url_rule else 'unmatched', elapsed)
+    breakdown = metrics.take_breakdown()
+    if breakdown is not None:
+        response.headers['Server-Timing'] = metrics.server_timing_header(breakdown, elapsed)
+    response.headers['X-Snapshot-Version'] = str(current_snapshot().version)
+    return response
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint: status is 'loading', 'ready' or 'degraded' (no NLP)"""
+    nlp_state = nlp_status()
+    snapshot = current_snapshot()
+    df, model, model_metadata = snapshot.df, snapshot.model, snapshot.model_metadata
+    if df is None or model_state in ("idle", "loading") or nlp_state == "loading":
+        status = 'loading'
+    elif model is None or nlp_state == "degraded":
+        status = 'degraded'
+    else:
+        status = 'ready'
+
     return jsonify({
-        'status': 'healthy',
+        'status': status,
+        'model_status': model_state,
+        'nlp_status': nlp_state,
         'model_loaded': model is not None,
+        'model_version': model_metadata['fingerprint'][:16] if model_metadata else None,
+        'snapshot_version': snapshot.version,
         'data_loaded': df is not None,
-        'nlp_available': nlp_classifier is not None
+        'nlp_available': nlp_state == "ready",
+        'nlp_cache': verdict_cache.stats(),
+        'nlp_tier': interaction_tier.stats() if interaction_tier is not None else None
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Stage timings, batch sizes and counters in the Prometheus text format"""
+    cache = verdict_cache.stats()
+    snapshot = current_snapshot()
+    extra = [
+        "# HELP pbm_nlp_cache_lookups_total Verdict cache lookups by outcome.",
+        "# TYPE pbm_nlp_cache_lookups_total counter",
+        f'pbm_nlp_cache_lookups_total{{result="memory_hit"}} {cache["memory_hits"]}',
+        f'pbm_nlp_cache_lookups_total{{result="disk_hit"}} {cache["disk_hits"]}',
+        f'pbm_nlp_cache_lookups_total{{result="miss"}} {cache["misses"]}',
+        "# HELP pbm_nlp_cache_entries Verdicts held in memory.",
+        "# TYPE pbm_nlp_cache_entries gauge",
+        f"pbm_nlp_cache_entries {cache['memory_entries']}",
+        "# HELP pbm_dataset_rows Drugs in the loaded dataset.",
+        "# TYPE pbm_dataset_rows gauge",
+        f"pbm_dataset_rows {len(snapshot.df) if snapshot.df is not None else 0}",
+        "# HELP pbm_model_ready Whether the recommendation model is loaded.",
+        "# TYPE pbm_model_ready gauge",
+        f"pbm_model_ready {int(snapshot.model is not None)}",
+        "# HELP pbm_snapshot_version Version of the published data and model snapshot.",
+        "# TYPE pbm_snapshot_version gauge",
+        f"pbm_snapshot_version {snapshot.version}",
+    ]
+    if interaction_tier is not None:
+        tier = interaction_tier.stats()
+        extra += [
+            "# HELP pbm_nlp_tier_answers_total Uncached interaction descriptions answered, by classifier tier.",
+            "# TYPE pbm_nlp_tier_answers_total counter",
+            f'pbm_nlp_tier_answers_total{{tier="fast"}} {tier["fast_answers"]}',
+            f'pbm_nlp_tier_answers_total{{tier="zero_shot"}} {tier["escalations"]}',
+            "# HELP pbm_nlp_tier_agreement_ratio Share of zero-shot verdicts the fast tier agreed with.",
+            "# TYPE pbm_nlp_tier_agreement_ratio gauge",
+            f"pbm_nlp_tier_agreement_ratio {tier['agreement_rate'] if tier['agreement_rate'] is not None else 'NaN'}",
+        ]
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+# Columns left out of /api/drugs unless requested with ?fields=
+HEAVY_DRUG_FIELDS = {'interaction_descriptions'}
+DRUG_FILTERS = {'therapeutic_class': 'therapeutic_class', 'state': 'state', 'te_code': 'therapeutic_equivalence_code'}
+MAX_PAGE_SIZE = 5000
+# Typeahead result rows per /api/search request
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+SEARCH_RESULT_FIELDS = ['ndc', 'drug_name', 'generic_name', 'therapeutic_class', 'therapeutic_equivalence_code', 'pmpm_cost']
+STREAM_BATCH_ROWS = 500
+# Distinguishes datasets across restarts in ETags
+startup_token = uuid.uuid4().hex[:8]
+batch_recommender = BatchRecommender()
+
+def start_batch_workers():
+    """Fork the batch scoring pool for the current snapshot; call before any other thread starts"""
+    snapshot = snapshots.current
+    return batch_recommender.start(
+        snapshot.model, snapshot.catalog, snapshot.table, snapshot.interactions, (startup_token, snapshot.version)
+    )
+
+def dataset_version():
+    return f"{startup_token}.{current_snapshot().version}"
+
+def default_drug_fields(frame):
+    return [col for col in frame.columns if col not in HEAVY_DRUG_FIELDS and not col.startswith('Unnamed')]
+
+def json_records(frame):
+    """Yield JSON-encoded rows with NaN mapped to null and NumPy scalars unboxed, column-wise"""
+    columns = list(frame.columns)
+    for start in range(0, len(frame), STREAM_BATCH_ROWS):
+        batch = frame.iloc[start:start + STREAM_BATCH_ROWS].astype(object)
+        values = batch.where(batch.notna(), None).to_numpy().tolist()
+        yield [json.dumps(dict(zip(columns, row)), default=str) for row in values]
+
 @app.route('/api/drugs', methods=['GET'])
 def get_drugs():
-    """Get all drugs from the dataset"""
+    """Get drugs, optionally paginated (limit/cursor), projected (fields) and filtered"""
+    df = current_snapshot().df
     if df is None:
         return jsonify({'error': 'Dataset not loaded'}), 500
     
     try:
-        # Convert DataFrame to list of dictionaries
-        drugs_list = df.to_dict('records')
+        etag = hashlib.sha1(f"{dataset_version()}?{request.query_string.decode()}".encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
         
-        # Clean up the data for frontend
-        for drug in drugs_list:
-            for key, value in drug.items():
-                if pd.isna(value):
-                    drug[key] = None
-                elif isinstance(value, (np.integer, np.floating)):
-                    drug[key] = float(value) if not np.isnan(value) else None
+        frame = df
+        mask = None
+        for param, column in DRUG_FILTERS.items():
+            value = request.args.get(param)
+            if value is not None and column in frame.columns:
+                matches = frame[column] == value
+                mask = matches if mask is None else mask & matches
+        if mask is not None:
+            frame = frame[mask]
         
-        return jsonify({
-            'drugs': drugs_list,
-            'total_count': len(drugs_list)
-        })
+        fields = request.args.get('fields')
+        if fields:
+            columns = [col for col in fields.split(',') if col in frame.columns]
+        else:
+            columns = default_drug_fields(frame)
+        
+        total_count = len(frame)
+        offset = max(0, int(request.args.get('cursor', 0)))
+        limit = request.args.get('limit')
+        end = total_count if limit is None else min(total_count, offset + max(0, min(int(limit), MAX_PAGE_SIZE)))
+        page = frame.iloc[offset:end][columns]
+        next_cursor = str(end) if end < total_count else None
+        
+        def generate():
+            yield '{"drugs": ['
+            first = True
+            for rows in json_records(page):
+                yield (',' if not first else '') + ','.join(rows)
+                first = False
+            yield f'], "total_count": {total_count}, "next_cursor": {json.dumps(next_cursor)}}}'
+        
+        return Response(generate(), mimetype='application/json', headers={'ETag': f'"{etag}"'})
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search', methods=['GET'])
+def search_drugs():
+    """Typeahead: ranked fuzzy matches of ?q= on drug name, generic name and NDC"""
+    snapshot = current_snapshot()
+    if snapshot.search is None:
+        return jsonify({'error': 'Dataset not loaded'}), 500
+    
+    try:
+        query = request.args.get('q', '').strip()
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_SEARCH_LIMIT)), MAX_SEARCH_LIMIT))
+        with metrics.timer('search'):
+            matches = snapshot.search.search(query, limit) if query else []
+        
+        with metrics.timer('serialize'):
+            columns = [col for col in SEARCH_RESULT_FIELDS if col in snapshot.df.columns]
+            rows = snapshot.df.iloc[[match['position'] for match in matches]][columns].astype(object)
+            results = rows.where(rows.notna(), None).to_dict('records')
+            for record, match in zip(results, matches):
+                record['match'] = {'field': match['field'], 'value': match['value'], 'score': match['score']}
+            return jsonify({'query': query, 'results': results})
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def aggregate_response(payload, aggregates):
+    """JSON response tagged with the version of the aggregates it was served from"""
+    with metrics.timer('serialize'):
+        response = jsonify(payload)
+    response.headers['X-Aggregates-Version'] = str(aggregates.version)
+    return response
+
 @app.route('/api/drug-stats', methods=['GET'])
 def get_drug_stats():
     """Get statistical overview of the drug dataset"""
-    if df is None:
+    aggregates = current_snapshot().aggregates
+    if aggregates is None:
         return jsonify({'error': 'Dataset not loaded'}), 500
     
     try:
-        stats = {
-            'total_drugs': len(df),
-            'total_cost': float(df['total_drug_cost'].sum()) if 'total_drug_cost' in df.columns else 0,
-            'total_members': int(df['member_count'].sum()) if 'member_count' in df.columns else 0,
-            'avg_pmpm': float(df['pmpm_cost'].mean()) if 'pmmp_cost' in df.columns else 0,
-            'therapeutic_classes': df['therapeutic_class'].nunique() if 'therapeutic_class' in df.columns else 0,
-            'states_covered': df['state'].nunique() if 'state' in df.columns else 0,
-            'avg_age': float(df['avg_age'].mean()) if 'avg_age' in df.columns else 0,
-            'te_codes_distribution': df['therapeutic_equivalence_code'].value_counts().to_dict() if 'therapeutic_equivalence_code' in df.columns else {}
-        }
-        return jsonify(stats)
+        return aggregate_response(aggregates.drug_stats(), aggregates)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/recommend', methods=['POST'])
 def get_recommendations():
     """Get ML-powered drug recommendations"""
+    snapshot = current_snapshot()
+    df, model = snapshot.df, snapshot.model
+    if model is None and model_state in ("idle", "loading") and df is not None:
+        return jsonify({'error': 'Model is still loading, retry shortly'}), 503
     if model is None or df is None:
         return jsonify({'error': 'Model or dataset not loaded'}), 500
     
@@ -124,13 +365,40 @@ def get_recommendations():
         # Convert to uppercase to match dataset format
         drug_names = [name.strip().upper() for name in drug_names]
         
-        # Find original drugs in dataset
-        original_drugs = df[df['drug_name'].isin(drug_names)]
+        # Find original drugs in dataset; names with no exact match resolve to the closest drug name
+        current_catalog = snapshot.catalog
+        resolved_names = {}
+        with metrics.timer('lookup'):
+            for i, name in enumerate(drug_names):
+                if len(current_catalog.positions('drug_name', name)):
+                    continue
+                resolved = snapshot.search.resolve(name)
+                if resolved is not None:
+                    resolved_names[name] = drug_names[i] = resolved
+            metrics.count('name_resolved', len(resolved_names))
+            original_drugs = current_catalog.rows(current_catalog.name_positions(drug_names))
         if original_drugs.empty:
             return jsonify({'error': 'None of the provided drugs found in dataset'}), 404
         
-        # Get recommendations using ML model
-        recommended_drugs = recommend_with_ml(model, original_drugs.to_dict('records'), df)
+        # Get recommendations using ML model; regimens of 3+ drugs also get runner-up options
+        # One slot per drug name, as recommend_with_ml does, so the analysis pairs each
+        # recommendation with the drug it replaces
+        regimens = None
+        if len(original_drugs) > 2:
+            original_drugs = original_drugs.drop_duplicates('drug_name')
+        if len(original_drugs) > 2:
+            budget_ms = data.get('time_budget_ms')
+            regimens = optimize_regimen(
+                model, original_drugs.to_dict('records'), current_catalog,
+                top_k=int(data.get('top_k', 3)),
+                time_budget=float(budget_ms) / 1000 if budget_ms is not None else REGIMEN_TIME_BUDGET,
+                interactions=snapshot.interactions
+            )
+            recommended_drugs = regimens[0]['drugs'] if regimens else None
+        else:
+            recommended_drugs = recommend_with_ml(
+                model, original_drugs.to_dict('records'), current_catalog, snapshot.table, snapshot.interactions
+            )
         
         if recommended_drugs is None:
             return jsonify({
@@ -144,6 +412,8 @@ def get_recommendations():
             'recommended_drugs': recommended_drugs,
             'analysis': {}
         }
+        if resolved_names:
+            result['resolved_names'] = resolved_names
         
         # Single drug recommendation analysis
         if len(recommended_drugs) == 1 and len(original_drugs) == 1:
@@ -159,17 +429,40 @@ def get_recommendations():
                 'generic_match': orig['generic_name'] == rec['generic_name']
             }
         
+        # Regimen analysis: every drug may be replaced
+        elif regimens:
+            total_orig_cost = float(original_drugs['pmpm_cost'].sum())
+            options = []
+            for regimen in regimens:
+                regimen_cost = float(sum(drug['pmpm_cost'] for drug in regimen['drugs']))
+                options.append({
+                    'drug_names': [drug['drug_name'] for drug in regimen['drugs']],
+                    'predicted_score': regimen['score'],
+                    'total_cost_saving': total_orig_cost - regimen_cost,
+                    'interaction_risk': regimen['max_interaction_risk']
+                })
+            best = options[0]
+            result['analysis'] = {
+                'type': 'regimen',
+                'total_cost_saving': best['total_cost_saving'],
+                'percentage_saving': (best['total_cost_saving'] / total_orig_cost) * 100 if total_orig_cost > 0 else 0,
+                'interaction_risk': best['interaction_risk'],
+                'safety_score': 'High' if best['interaction_risk'] == 0 else 'Medium' if best['interaction_risk'] == 1 else 'Low',
+                'alternatives': options
+            }
+        
         # Multiple drug combination analysis
         elif len(recommended_drugs) >= 2 and len(original_drugs) >= 2:
             orig1, orig2 = original_drugs.iloc[0], original_drugs.iloc[1]
             rec1, rec2 = recommended_drugs[0], recommended_drugs[1]
             
-            total_orig_cost = float(orig1['pmmp_cost'] + orig2['pmpm_cost'])
+            total_orig_cost = float(orig1['pmpm_cost'] + orig2['pmpm_cost'])
             total_rec_cost = float(rec1['pmpm_cost'] + rec2['pmpm_cost'])
             total_saving = total_orig_cost - total_rec_cost
             
             # Check for drug interactions
-            interaction_risk, interaction_desc = check_interaction_nlp(rec1, rec2)
+            with metrics.timer('interaction_check'):
+                interaction_risk, interaction_desc = check_interaction_nlp(rec1, rec2, snapshot.interactions)
             
             result['analysis'] = {
                 'type': 'combination',
@@ -180,77 +473,167 @@ def get_recommendations():
                 'safety_score': 'High' if interaction_risk == 0 else 'Medium' if interaction_risk == 1 else 'Low'
             }
         
-        return jsonify(result)
+        with metrics.timer('serialize'):
+            return jsonify(result)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/recommend/batch', methods=['POST'])
+def get_batch_recommendations():
+    """Recommend for many regimens (JSON array or CSV upload), streamed as NDJSON with a plan-level summary"""
+    snapshot = current_snapshot()
+    if snapshot.model is None or snapshot.df is None:
+        return jsonify({'error': 'Model or dataset not loaded'}), 503 if model_state == "loading" else 500
+    
+    try:
+        if 'file' in request.files:
+            rows = parse_regimen_csv(request.files['file'])
+        else:
+            data = request.get_json()
+            rows = data.get('regimens', []) if isinstance(data, dict) else data
+            # Plain lists of names are accepted as regimens too
+            rows = [row if isinstance(row, dict) else {'drug_names': row} for row in rows or []]
+        
+        if not rows:
+            return jsonify({'error': 'No regimens provided'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # The stream reads the request's snapshot throughout, whatever is published meanwhile
+    version = (startup_token, snapshot.version)
+    
+    def generate():
+        records = batch_recommender.recommend(
+            snapshot.model, snapshot.catalog, snapshot.table, version, rows, snapshot.interactions
+        )
+        for record in records:
+            yield json.dumps(record, default=lambda value: value.item() if hasattr(value, 'item') else str(value)) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/api/therapeutic-classes', methods=['GET'])
 def get_therapeutic_classes():
     """Get all therapeutic classes with drug counts"""
-    if df is None:
+    aggregates = current_snapshot().aggregates
+    if aggregates is None:
         return jsonify({'error': 'Dataset not loaded'}), 500
     
     try:
-        class_counts = df['therapeutic_class'].value_counts().to_dict()
-        classes = [{'name': name, 'count': count} for name, count in class_counts.items()]
-        return jsonify({'therapeutic_classes': classes})
+        return aggregate_response({'therapeutic_classes': aggregates.therapeutic_classes()}, aggregates)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cost-analysis', methods=['GET'])
 def get_cost_analysis():
     """Get cost analysis data for visualization"""
-    if df is None:
+    aggregates = current_snapshot().aggregates
+    if aggregates is None:
         return jsonify({'error': 'Dataset not loaded'}), 500
     
     try:
-        # Cost by therapeutic class
-        cost_by_class = df.groupby('therapeutic_class')['total_drug_cost'].sum().to_dict()
-        
-        # PMPM trends by state
-        pmpm_by_state = df.groupby('state')['pmpm_cost'].mean().to_dict()
-        
-        # Age distribution analysis
-        age_bins = pd.cut(df['avg_age'], bins=[0, 30, 50, 65, 100], labels=['<30', '30-50', '50-65', '65+'])
-        age_distribution = age_bins.value_counts().to_dict()
-        
-        return jsonify({
-            'cost_by_therapeutic_class': cost_by_class,
-            'pmpm_by_state': pmpm_by_state,
-            'age_distribution': {str(k): v for k, v in age_distribution.items()}
-        })
+        return aggregate_response(aggregates.cost_analysis(), aggregates)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def apply_ingest(rows):
+    """Run rows through incremental ingestion and publish the updated data and model as the next snapshot"""
+    with snapshots.write_lock:
+        snapshot = snapshots.current
+        result = ingest_drugs(
+            drug_store, rows, snapshot.model, snapshot.table, snapshot.catalog, snapshot.interactions
+        )
+        if not result['added'].empty:
+            try:
+                next_snapshot = snapshot.evolve(
+                    df=drug_store.frame(),
+                    catalog=result['catalog'],
+                    search=snapshot.search.with_rows(drug_store.frame(), result['positions']),
+                    interactions=result['interaction_index'],
+                    aggregates=snapshot.aggregates.with_rows(result['added']),
+                    model=result['model'],
+                    table=result['table']
+                )
+            except Exception:
+                # The rows never reach a snapshot, so take them back out of the store
+                drug_store.truncate(result['positions'][0])
+                raise
+            snapshot = snapshots.publish(next_snapshot)
+    # The response reports the snapshot that includes the new rows
+    g.snapshot = snapshot
+    return result
+
+def ingest_disabled_response():
+    return jsonify({
+        'error': 'Runtime inserts are disabled in multi-process serving; update the dataset and the workers reload'
+    }), 409
+
 @app.route('/api/add-drug', methods=['POST'])
 def add_drug():
     """Add a new drug to the dataset"""
-    global df
-    if df is None:
+    if current_snapshot().df is None:
         return jsonify({'error': 'Dataset not loaded'}), 500
+    if not ingest_enabled:
+        return ingest_disabled_response()
     
     try:
         data = request.get_json()
         
         # Validate required fields
-        required_fields = ['ndc', 'drug_name', 'generic_name', 'therapeutic_class', 'pmpm_cost']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
+        for field in missing_fields(data):
+            return jsonify({'error': f'Missing required field: {field}'}), 400
         
-        # Create new drug entry
-        new_drug = pd.DataFrame([data])
-        df = pd.concat([df, new_drug], ignore_index=True)
+        result = apply_ingest([data])
+        if result['rejected']:
+            return jsonify({'error': 'Drug has an invalid pmpm_cost or empty name fields'}), 400
         
         return jsonify({'message': 'Drug added successfully', 'drug': data})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/add-drugs', methods=['POST'])
+def add_drugs():
+    """Bulk-add drugs from a JSON array or an uploaded CSV file"""
+    if current_snapshot().df is None:
+        return jsonify({'error': 'Dataset not loaded'}), 500
+    if not ingest_enabled:
+        return ingest_disabled_response()
+    
+    try:
+        if 'file' in request.files:
+            rows = pd.read_csv(request.files['file']).to_dict('records')
+        else:
+            data = request.get_json()
+            rows = data.get('drugs', []) if isinstance(data, dict) else data
+        
+        if not rows:
+            return jsonify({'error': 'No drugs provided'}), 400
+        
+        # Rows missing required fields are reported back rather than failing the batch
+        invalid = [{'row': i, 'missing_fields': missing_fields(row)} for i, row in enumerate(rows) if missing_fields(row)]
+        valid_rows = [row for row in rows if not missing_fields(row)]
+        
+        result = apply_ingest(valid_rows)
+        return jsonify({
+            'message': f"Added {len(result['added'])} of {len(rows)} drugs",
+            'added_count': len(result['added']),
+            'rejected_count': len(invalid) + result['rejected'],
+            'invalid_rows': invalid,
+            'new_training_pairs': result['new_pairs']
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     print("🚀 Starting PBM ML Server...")
-    if initialize_model():
+    # Loaded up front: the batch pool is forked once, before request threads exist, and shares the model and BART
+    if initialize_model(background=False):
+        get_nlp_classifier()
+        start_batch_workers()
         print("✅ Server ready!")
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        try:
+            app.run(debug=True, host='0.0.0.0', port=5000)
+        finally:
+            batch_recommender.close()
     else:
         print("❌ Failed to initialize server")
\ No newline at end of file
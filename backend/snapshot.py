@@ -0,0 +1,51 @@
+import threading
+from collections import namedtuple
+
+
+_SnapshotFields = namedtuple(
+    "_SnapshotFields",
+    ["version", "df", "catalog", "search", "interactions", "aggregates", "model", "model_metadata", "table"]
+)
+
+
+class Snapshot(_SnapshotFields):
+    """
+    Everything a request reads, published together: the dataset frame, the drug
+    catalog and its indexes, the name search index, the interaction index, the
+    dashboard aggregates, the model with its metadata and the recommendation table. Never modified once published;
+    writers derive the next snapshot with evolve().
+    """
+
+    __slots__ = ()
+
+    def evolve(self, **changes):
+        """A copy with some fields replaced and the next version number."""
+        return self._replace(version=self.version + 1, **changes)
+
+
+EMPTY_SNAPSHOT = Snapshot(0, None, None, None, None, None, None, None, None)
+
+
+class SnapshotStore:
+    """
+    Atomic reference to the current Snapshot.
+
+    Readers take `current` once per request and read only from it, without
+    locks: rebinding an attribute is atomic, so they see either the old or the
+    new snapshot, never a mix. Writers serialize on `write_lock`, build the next
+    snapshot from the current one and publish() it.
+    """
+
+    def __init__(self):
+        self.current = EMPTY_SNAPSHOT
+        self.write_lock = threading.RLock()
+
+    def publish(self, snapshot):
+        with self.write_lock:
+            self.current = snapshot
+        return snapshot
+
+    def update(self, **changes):
+        """Publishes the current snapshot with `changes` applied, as the next version."""
+        with self.write_lock:
+            return self.publish(self.current.evolve(**changes))
@@ -0,0 +1,177 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Shapes measured on data/testtt01.csv.
+CLASS_SIZE_WEIGHTS = {1: 7, 2: 10, 3: 12, 4: 1, 5: 2, 7: 1, 9: 1}
+TE_CODE_WEIGHTS = {'AB': 41, 'NA': 38, 'AA': 3, 'AP': 3, 'AB1': 2, 'AB3': 2, 'BX': 2, 'AT': 1}
+STATE_WEIGHTS = {'CA': 17, 'TX': 15, 'FL': 11, 'NY': 10, 'PA': 10, 'GA': 6, 'IL': 5, 'OH': 5,
+                 'VA': 4, 'MI': 3, 'WA': 2, 'NC': 2, 'NV': 1, 'MD': 1}
+DESCRIPTIONS_PER_GENERIC = 5
+# Share of rows whose drug_name repeats another row's, as PROZAC and PREDNISONE do in the sample.
+DUPLICATE_NAME_RATE = 0.02
+# Share of rows sold under the generic name itself (e.g. BUDESONIDE next to Uceris).
+GENERIC_NAMED_RATE = 0.2
+
+INTERACTION_TEMPLATES = [
+    "{a} may decrease the excretion rate of {b} which could result in a higher serum level.",
+    "The serum concentration of {a} can be increased when it is combined with {b}.",
+    "The risk or severity of adverse effects can be increased when {a} is combined with {b}.",
+    "The metabolism of {b} can be increased when combined with {a}.",
+    "The risk or severity of hemorrhage can be increased when {a} is combined with {b}.",
+    "{b} may increase the hypotensive activities of {a}.",
+]
+EFFICACY_PHRASES = [
+    "Significantly better than placebo on primary endpoint",
+    "Non-inferior to reference product in pivotal trials",
+    "Reduced hospitalizations by 20% versus standard care",
+    "Induces remission in mild-to-moderate disease.",
+    "Improves symptom scores at 8 weeks",
+]
+CLASS_STEMS = ['Anti-Inflammatory Agents', 'Antifungal Agents', 'Blood Glucose Lowering Agents',
+               'Anticoagulants', 'Antidepressive Agents', 'Antihypertensive Agents', 'Lipid Modifying Agents',
+               'Antiviral Agents', 'Antineoplastic Agents', 'Bronchodilators', 'Anticonvulsants', 'Analgesics']
+SYLLABLES = ['ba', 'ce', 'da', 'fe', 'ga', 'lo', 'ma', 'ni', 'po', 'ra', 'si', 'ta', 'vo', 'xa', 'ze', 'qui',
+             'tri', 'pra', 'clo', 'mer', 'lin', 'dor', 'zan', 'ver']
+GENERIC_SUFFIXES = ['pril', 'olol', 'statin', 'azole', 'sone', 'mab', 'tide', 'vir', 'pine', 'xetine']
+BRAND_SUFFIXES = ['x', 'ra', 'lix', 'zor', 'dia', 'tro', 'na', 'vel']
+
+
+def _weighted(rng, weights, size):
+    values = np.array(list(weights), dtype=object)
+    p = np.array(list(weights.values()), dtype=float)
+    return values[rng.choice(len(values), size=size, p=p / p.sum())]
+
+
+def _coined_names(rng, count, suffixes, syllables=3):
+    """`count` distinct made-up words: a mixed-radix spelling of a shuffled index, plus a suffix."""
+    base = len(SYLLABLES)
+    while base ** syllables < count:
+        syllables += 1
+    codes = rng.permutation(base ** syllables)[:count] if base ** syllables <= 10 ** 7 else \
+        rng.choice(base ** syllables, size=count, replace=False)
+    words = []
+    for i, code in enumerate(codes):
+        parts = []
+        for _ in range(syllables):
+            code, digit = divmod(int(code), base)
+            parts.append(SYLLABLES[digit])
+        words.append(''.join(parts) + suffixes[i % len(suffixes)])
+    return words
+
+
+def _money(values, decimals=0):
+    return [f"${value:,.{decimals}f}" for value in values]
+
+
+def generate_formulary(n_drugs, seed=0):
+    """
+    Returns a raw formulary DataFrame with the columns and formats of
+    data/testtt01.csv: therapeutic class sizes, generics shared within a class,
+    TE code mix, costs as "$1,234" strings and interaction description lists that
+    mention other generics. Same seed and size, same rows.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Therapeutic classes with the sample's size distribution.
+    sizes = []
+    while sum(sizes) < n_drugs:
+        sizes += list(_weighted(rng, CLASS_SIZE_WEIGHTS, max(16, (n_drugs - sum(sizes)) // 2)))
+    sizes = np.array(sizes, dtype=np.int64)
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), n_drugs) + 1]
+    sizes[-1] -= sizes.sum() - n_drugs
+    n_classes = len(sizes)
+    stems = _weighted(rng, {stem: 1 for stem in CLASS_STEMS}, n_classes)
+    qualifiers = _coined_names(rng, n_classes, [''], syllables=2)
+    class_names = [f"{stem}, {qualifier.title()}" for stem, qualifier in zip(stems, qualifiers)]
+
+    # A class shares one to a few generics between its drugs.
+    generics_per_class = np.minimum(sizes, 1 + rng.binomial(np.maximum(sizes - 1, 0), 0.15))
+    n_generics = int(generics_per_class.sum())
+    generic_names = [name.upper() for name in _coined_names(rng, n_generics, GENERIC_SUFFIXES)]
+    generic_offsets = np.concatenate([[0], np.cumsum(generics_per_class)[:-1]])
+    row_class = np.repeat(np.arange(n_classes), sizes)
+    row_generic = generic_offsets[row_class] + (rng.integers(0, 1 << 30, n_drugs) % generics_per_class[row_class])
+
+    # Every generic has its own interaction list naming other generics.
+    partners = rng.integers(0, n_generics, size=(n_generics, DESCRIPTIONS_PER_GENERIC))
+    templates = rng.integers(0, len(INTERACTION_TEMPLATES), size=(n_generics, DESCRIPTIONS_PER_GENERIC))
+    descriptions = [
+        [INTERACTION_TEMPLATES[t].format(a=generic_names[g].title(), b=generic_names[p].title())
+         for t, p in zip(templates[g], partners[g])]
+        for g in range(n_generics)
+    ]
+    description_lists = [str(items) for items in descriptions]
+    picked = rng.integers(0, DESCRIPTIONS_PER_GENERIC, n_drugs)
+
+    brand_names = _coined_names(rng, n_drugs, BRAND_SUFFIXES)
+    drug_names = np.array([name.title() for name in brand_names], dtype=object)
+    generic_named = rng.random(n_drugs) < GENERIC_NAMED_RATE
+    drug_names[generic_named] = np.array(generic_names, dtype=object)[row_generic[generic_named]]
+    duplicated = np.flatnonzero(rng.random(n_drugs) < DUPLICATE_NAME_RATE)
+    drug_names[duplicated] = drug_names[rng.integers(0, n_drugs, len(duplicated))]
+
+    te_codes = _weighted(rng, TE_CODE_WEIGHTS, n_drugs)
+    fills = rng.integers(5, 400, n_drugs) * 100
+    members = rng.integers(10, 2500, n_drugs)
+    pmpm = np.round(np.exp(rng.normal(3.3, 1.1, n_drugs)), 2)
+    total_cost = np.round(pmpm * members * 12, -3)
+    days = rng.integers(0, 600, n_drugs)
+    created = pd.Timestamp('2024-01-01') + pd.to_timedelta(days, unit='D')
+    atc = [f"{chr(65 + c % 26)}{c % 90 + 10:02d}{chr(65 + c % 23)}{chr(65 + c % 17)}{c % 90 + 10:02d}"
+           for c in range(n_classes)]
+
+    frame = pd.DataFrame({
+        'ndc': [f"{10000 + i // 10000:05d}-{i % 10000:04d}-{i % 97:02d}" for i in range(n_drugs)],
+        'drug_name': drug_names,
+        'generic_name': np.array(generic_names, dtype=object)[row_generic],
+        'atc_code': np.array(atc, dtype=object)[row_class],
+        'therapeutic_class': np.array(class_names, dtype=object)[row_class],
+        'therapeutic_equivalence_code': te_codes,
+        'therapeutic_equivalence_code.1': te_codes,
+        'total_prescription_fills': [f"{value:,}" for value in fills],
+        'total_drug_cost': _money(total_cost),
+        'pmpm_cost': _money(pmpm, 2),
+        'member_count': members,
+        'avg_age': rng.integers(20, 80, n_drugs),
+        'state': _weighted(rng, STATE_WEIGHTS, n_drugs),
+        'drug_interactions': [descriptions[g][k] for g, k in zip(row_generic, picked)],
+        'clinical_efficacy': _weighted(rng, {phrase: 1 for phrase in EFFICACY_PHRASES}, n_drugs),
+        'created_at': created.strftime('%d-%m-%Y'),
+        'updated_at': '21-08-2025',
+        'DrugBank ID': [f"DB{10000 + g:05d}" for g in row_generic],
+        'interaction_descriptions': np.array(description_lists, dtype=object)[row_generic],
+    })
+    return frame
+
+
+def write_formulary(path, n_drugs, seed=0):
+    """
+    Writes a synthetic formulary CSV with the sample's header quirks: the repeated
+    therapeutic_equivalence_code column and seven empty trailing columns.
+    """
+    frame = generate_formulary(n_drugs, seed)
+    header = [col[:-2] if col.endswith('.1') else col for col in frame.columns] + [''] * 7
+    for i in range(7):
+        frame[f'_empty{i}'] = ''
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    frame.to_csv(path, index=False, header=header)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic drug formulary CSV.")
+    parser.add_argument('--drugs', type=int, default=10_000, help="number of drug rows (1k to 1M)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help="output CSV (default: data/synthetic_<drugs>.csv)")
+    args = parser.parse_args()
+
+    path = write_formulary(args.out or f"data/synthetic_{args.drugs}.csv", args.drugs, args.seed)
+    print(f"✅ Wrote {args.drugs} synthetic drugs to '{path}'.")
+
+
+if __name__ == "__main__":
+    main()
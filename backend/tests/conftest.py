@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_PATH = os.path.join(BACKEND_DIR, "data", "testtt01.csv")
+
+# Offline and repeatable, as in benchmark.py: no persistent verdict cache, no BART
+# warm-up, no distilled tier and throwaway model artifacts. Set before app is imported.
+os.environ.setdefault("NLP_CACHE_PATH", "")
+os.environ.setdefault("NLP_WARMUP", "0")
+os.environ.setdefault("INTERACTION_TIER_PATH", "")
+os.environ.setdefault("MODEL_ARTIFACT_DIR", tempfile.mkdtemp(prefix="pbm-test-artifacts-"))
+sys.path.insert(0, BACKEND_DIR)
+
+import app as recommender  # noqa: E402
+from benchmark import StubClassifier  # noqa: E402
+from snapshot import SnapshotStore  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def stub_classifier():
+    """Every test runs against the deterministic stub instead of BART, with an empty verdict cache."""
+    classifier = StubClassifier()
+    recommender.set_nlp_classifier(classifier)
+    recommender.verdict_cache.clear()
+    yield classifier
+    recommender.verdict_cache.clear()
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    """The cleaned sample dataset. Shared by the tests, so never modify it."""
+    df = recommender.load_and_clean_data(DATASET_PATH)
+    assert df is not None
+    return df
+
+
+@pytest.fixture
+def server_state(monkeypatch):
+    """The Flask app with freshly loaded data and model, published as its first snapshots."""
+    import server
+
+    monkeypatch.setattr(server, "DATASET_PATH", DATASET_PATH)
+    monkeypatch.setattr(server, "snapshots", SnapshotStore())
+    monkeypatch.setattr(server, "ingest_enabled", True)
+    assert server.initialize_model(background=False)
+    return server
+
+
+@pytest.fixture
+def client(server_state):
+    return server_state.app.test_client()
+
+
+def drug_row(name, **fields):
+    """A valid /api/add-drug payload."""
+    row = {
+        'ndc': f"99999-{abs(hash(name)) % 10000:04d}-00",
+        'drug_name': name,
+        'generic_name': 'FLUCONAZOLE',
+        'therapeutic_class': 'Antifungals',
+        'pmpm_cost': 5.0,
+        'therapeutic_equivalence_code': 'AB',
+    }
+    row.update(fields)
+    return row
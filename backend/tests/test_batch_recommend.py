@@ -0,0 +1,53 @@
+import batch_recommend
+from batch_recommend import BatchRecommender, regimen_key, score_regimen
+from conftest import drug_row
+
+
+def test_regimen_key_is_canonical():
+    assert regimen_key(['zoloft ', 'PROZAC', '', 'Zoloft']) == ('PROZAC', 'ZOLOFT')
+
+
+def test_duplicate_names_are_priced_once(server_state):
+    snapshot = server_state.snapshots.current
+    catalog = snapshot.catalog
+    counts = snapshot.df['drug_name'].value_counts()
+    duplicated = counts[counts > 1].index[:2].tolist()
+    single = counts[counts == 1].index[:1].tolist()
+    key = regimen_key(duplicated + single)
+
+    scored = score_regimen(snapshot.model, catalog, snapshot.table, key)
+
+    assert scored['status'] == 'ok'
+    # One slot per drug name, priced at its first row, as recommend_with_ml replaces them
+    first_costs = [catalog.costs[catalog.positions('drug_name', name)[0]] for name in key]
+    assert scored['original_cost'] == sum(first_costs)
+    assert len(scored['recommended_drugs']) == len(key)
+    assert scored['saving_per_member'] == scored['original_cost'] - scored['recommended_cost']
+
+
+def test_pool_is_forked_once_and_later_snapshots_score_inline(server_state, client, monkeypatch):
+    monkeypatch.setattr(batch_recommend, 'INLINE_THRESHOLD', 1)
+    recommender = BatchRecommender(workers=2)
+    snapshot = server_state.snapshots.current
+    names = snapshot.df['drug_name'].unique()[:6].tolist()
+    rows = [{'drug_names': [a, b]} for a in names for b in names if a < b]
+
+    def run(snapshot):
+        return list(recommender.recommend(
+            snapshot.model, snapshot.catalog, snapshot.table, snapshot.version, rows, snapshot.interactions
+        ))
+
+    inline = run(snapshot)
+    assert recommender.start(snapshot.model, snapshot.catalog, snapshot.table, snapshot.interactions, snapshot.version)
+    pool = recommender._pool
+    try:
+        assert run(snapshot) == inline
+        assert client.post('/api/add-drug', json=drug_row('POOLOL')).status_code == 200
+        later = server_state.snapshots.current
+        assert later.version != snapshot.version
+        assert len(run(later)) == len(inline)
+        assert recommender._pool is pool
+        assert not recommender.start(later.model, later.catalog, later.table, later.interactions, later.version)
+    finally:
+        recommender.close()
+    assert recommender._pool is None
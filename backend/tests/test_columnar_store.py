@@ -0,0 +1,52 @@
+import os
+
+import pandas as pd
+
+from columnar_store import MANIFEST_NAME, find_columnar, load_columnar, read_manifest, write_columnar
+
+
+def test_round_trip_keeps_every_value(dataset, tmp_path):
+    path = str(tmp_path / "drugs.columnar")
+    write_columnar(dataset, path)
+
+    loaded = load_columnar(path)
+
+    assert list(loaded.columns) == list(dataset.columns)
+    for col in dataset.columns:
+        pd.testing.assert_series_equal(
+            loaded[col].astype(object), dataset[col].astype(object), check_names=False, check_index=False
+        )
+
+
+def test_nearly_unique_strings_stay_out_of_the_manifest(dataset, tmp_path):
+    path = str(tmp_path / "drugs.columnar")
+    write_columnar(dataset, path)
+
+    kinds = {column['name']: column['kind'] for column in read_manifest(path)['columns']}
+    assert kinds['drug_interactions'] == kinds['clinical_efficacy'] == 'text'
+    assert kinds['therapeutic_equivalence_code'] == kinds['state'] == 'categorical'
+    assert os.path.getsize(os.path.join(path, MANIFEST_NAME)) < 8 * 1024
+    assert isinstance(load_columnar(path)['state'].dtype, pd.CategoricalDtype)
+
+
+def test_missing_text_values_load_as_nan(tmp_path):
+    df = pd.DataFrame({'drug_interactions': ['a', None, 'c', 'd'], 'pmpm_cost': [1.0, 2.0, 3.0, 4.0]})
+    path = str(tmp_path / "drugs.columnar")
+    write_columnar(df, path)
+
+    loaded = load_columnar(path)
+
+    assert loaded['drug_interactions'].isna().tolist() == [False, True, False, False]
+    assert loaded['drug_interactions'].iloc[2] == 'c'
+
+
+def test_stale_copy_is_ignored(tmp_path):
+    csv_path = tmp_path / "drugs.csv"
+    csv_path.write_text("drug_name,pmpm_cost\nA,1.0\n")
+    path = os.path.splitext(str(csv_path))[0] + ".columnar"
+    write_columnar(pd.DataFrame({'drug_name': ['A'], 'pmpm_cost': [1.0]}), path,
+                   source={'size': csv_path.stat().st_size, 'mtime_ns': csv_path.stat().st_mtime_ns})
+
+    assert find_columnar(str(csv_path)) == path
+    csv_path.write_text("drug_name,pmpm_cost\nA,1.0\nB,2.0\n")
+    assert find_columnar(str(csv_path)) is None
@@ -0,0 +1,63 @@
+import numpy as np
+
+import app as recommender
+from drug_catalog import DrugCatalog, INDEXED_COLUMNS
+
+
+def assert_matches_frame(catalog, df):
+    assert len(catalog) == len(df)
+    everything = np.arange(len(df))
+    for col in INDEXED_COLUMNS:
+        values = df[col].astype(object).to_numpy()
+        assert list(catalog.values(col, everything)) == [None if v is None or v != v else v for v in values]
+        for value in df[col].dropna().unique()[:25]:
+            np.testing.assert_array_equal(catalog.positions(col, value), np.flatnonzero(values == value))
+    np.testing.assert_array_equal(catalog.costs, df['pmpm_cost'].to_numpy(dtype=float))
+    np.testing.assert_array_equal(catalog.is_equivalent, (df['therapeutic_equivalence_code'] != 'NA').to_numpy())
+
+
+def test_catalog_matches_the_dataframe(dataset):
+    assert_matches_frame(DrugCatalog(dataset), dataset)
+
+
+def test_feature_frame_matches_the_dataframe_path(dataset):
+    catalog = DrugCatalog(dataset)
+    for original in dataset.iloc[[0, len(dataset) // 2, -1]].to_dict('records'):
+        positions = catalog.class_positions(original['therapeutic_class'])
+        expected = recommender.candidate_feature_frame(original, dataset.iloc[positions])
+        actual = catalog.feature_frame(original, positions)
+        assert actual.columns.tolist() == expected.columns.tolist()
+        np.testing.assert_array_equal(actual.to_numpy(), expected.to_numpy())
+
+
+def test_name_positions_match_isin(dataset):
+    catalog = DrugCatalog(dataset)
+    names = list(dataset['drug_name'].unique()[:5]) + ['NOT A DRUG']
+    np.testing.assert_array_equal(catalog.name_positions(names), np.flatnonzero(dataset['drug_name'].isin(names)))
+
+
+def test_with_rows_matches_a_full_build_and_keeps_the_parent(dataset):
+    split = len(dataset) - 50
+    parent = DrugCatalog(dataset.iloc[:split])
+
+    grown = parent
+    for start in range(split, len(dataset), 10):
+        grown = grown.with_rows(dataset, np.arange(start, min(start + 10, len(dataset))))
+
+    assert_matches_frame(grown, dataset)
+    assert_matches_frame(parent, dataset.iloc[:split])
+
+
+def test_a_discarded_version_does_not_break_later_ones(dataset):
+    head = dataset.iloc[:31]
+    parent = DrugCatalog(head)
+    grown_df = dataset.iloc[:40]
+
+    # Built for an insert that failed later on, then thrown away
+    parent.with_rows(grown_df, np.arange(31, 33))
+
+    catalog = parent
+    for start in range(31, 40, 3):
+        catalog = catalog.with_rows(grown_df, np.arange(start, start + 3))
+    assert_matches_frame(catalog, grown_df)
+    assert_matches_frame(parent, head)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from drug_search import DrugSearchIndex
+
+
+def names_frame(names):
+    return pd.DataFrame({
+        'drug_name': names,
+        'generic_name': ['GENERIC'] * len(names),
+        'ndc': [f"12345-{i:04d}-01" for i in range(len(names))],
+    })
+
+
+def test_exact_match_ranks_before_prefix_and_fuzzy_matches():
+    index = DrugSearchIndex(names_frame(['PROZAC', 'PROZAC WEEKLY', 'PROZAN', 'LIPITOR']))
+
+    found = [match['value'] for match in index.search('prozac')]
+
+    assert found[:2] == ['PROZAC', 'PROZAC WEEKLY']
+    assert 'PROZAN' in found
+    assert 'LIPITOR' not in found
+
+
+def test_prefix_finds_every_match():
+    index = DrugSearchIndex(names_frame(['ATORVASTATIN', 'ATORVALIQ', 'ROSUVASTATIN']))
+
+    assert {match['value'] for match in index.search('ATORV')} == {'ATORVASTATIN', 'ATORVALIQ'}
+
+
+def test_digits_match_ndcs():
+    index = DrugSearchIndex(names_frame(['A DRUG', 'B DRUG']))
+
+    match = index.search('123450001')[0]
+
+    assert (match['position'], match['field'], match['value']) == (1, 'ndc', '12345-0001-01')
+
+
+def test_search_matches_the_dataset(dataset):
+    index = DrugSearchIndex(dataset)
+    name = dataset['drug_name'].iloc[len(dataset) // 3]
+
+    top = index.search(name.lower(), limit=50)
+
+    expected = np.flatnonzero(dataset['drug_name'] == name)
+    assert {match['position'] for match in top[:len(expected)]} == set(expected.tolist())
+
+
+def test_with_rows_indexes_new_rows_and_keeps_the_parent():
+    df = names_frame(['PROZAC', 'LIPITOR', 'ZOLOFT'])
+    parent = DrugSearchIndex(df.iloc[:2])
+
+    grown = parent.with_rows(df, [2])
+
+    assert grown.search('zoloft')[0]['position'] == 2
+    assert parent.search('zoloft') == []
+    assert len(grown) == len(DrugSearchIndex(df))
+
+
+def test_resolve_prefers_the_closest_name_and_refuses_ties():
+    index = DrugSearchIndex(names_frame(['FLUOXETINA', 'FLUOXETINO', 'PAROXETINE']))
+
+    assert index.resolve('PAROXETIN') == 'PAROXETINE'
+    assert index.resolve('FLUOXETINE') is None
+    assert index.resolve('LIPITOR') is None
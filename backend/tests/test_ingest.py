@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as recommender
+from drug_catalog import DrugCatalog
+from ingest import DrugStore, ingest_drugs
+from recommendation_table import RecommendationTable
+from conftest import drug_row
+
+
+def test_append_grows_the_store_and_keeps_earlier_frames():
+    store = DrugStore(pd.DataFrame({'drug_name': pd.Categorical(['A', 'B']), 'pmpm_cost': [1.0, 2.0]}))
+    before = store.frame()
+
+    positions = store.append(pd.DataFrame({'drug_name': [f"N{i}" for i in range(40)], 'pmpm_cost': np.arange(40.0)}))
+
+    assert list(positions) == list(range(2, 42))
+    frame = store.frame()
+    assert len(frame) == 42
+    assert frame['drug_name'].iloc[-1] == 'N39'
+    assert frame['pmpm_cost'].iloc[-1] == 39.0
+    assert list(before['drug_name']) == ['A', 'B']
+
+
+def test_string_values_keep_numeric_columns_numeric():
+    store = DrugStore(pd.DataFrame({'avg_age': [30, 40]}))
+    store.append(pd.DataFrame({'avg_age': ['45']}))
+
+    assert store.frame()['avg_age'].dtype.kind == 'i'
+    assert list(store.frame()['avg_age']) == [30, 40, 45]
+
+
+def test_truncate_drops_appended_rows():
+    store = DrugStore(pd.DataFrame({'pmpm_cost': [1.0, 2.0]}))
+    store.append(pd.DataFrame({'pmpm_cost': [3.0, 4.0]}))
+    store.truncate(2)
+
+    assert len(store) == 2
+    assert list(store.frame()['pmpm_cost']) == [1.0, 2.0]
+    store.append(pd.DataFrame({'pmpm_cost': [5.0]}))
+    assert list(store.frame()['pmpm_cost']) == [1.0, 2.0, 5.0]
+
+
+def test_failed_ingest_leaves_the_store_unchanged(dataset, monkeypatch):
+    store = DrugStore(dataset)
+    catalog = DrugCatalog(store.frame())
+    index = recommender.interaction_index
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("catalog update failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(DrugCatalog, 'with_rows', fail)
+        with pytest.raises(RuntimeError):
+            ingest_drugs(store, [drug_row('BROKENOL')], catalog=catalog)
+
+    assert len(store) == len(dataset)
+    assert recommender.interaction_index is index
+
+    result = ingest_drugs(store, [drug_row('WORKINGOL')], catalog=catalog)
+    assert len(store) == len(dataset) + 1
+    assert len(result['catalog']) == len(store)
+    assert list(result['positions']) == [len(dataset)]
+    assert result['catalog'].values('drug_name', result['positions'])[0] == 'WORKINGOL'
+
+
+def test_table_keeps_its_model_after_continued_training(server_state):
+    snapshot = server_state.snapshots.current
+    store = DrugStore(snapshot.df)
+    existing = snapshot.df.iloc[0].to_dict()
+    row = drug_row('TRAINOL', generic_name=existing['generic_name'], therapeutic_class=existing['therapeutic_class'])
+
+    result = ingest_drugs(store, [row], snapshot.model, snapshot.table, snapshot.catalog, snapshot.interactions)
+
+    assert result['new_pairs'] > 0 and result['model'] is not snapshot.model
+    assert result['table'].model is snapshot.table.model
+    rebuilt = RecommendationTable(snapshot.table.model, result['catalog'], interactions=result['interaction_index'])
+
+    def ranking(table, drug):
+        return [(alternative['drug_name'], score) for alternative, score in table.get(drug)]
+
+    for drug in (result['catalog'].records(result['positions'])[0], existing):
+        assert ranking(result['table'], drug) == ranking(rebuilt, drug)
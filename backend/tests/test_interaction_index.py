@@ -0,0 +1,96 @@
+import threading
+
+import pandas as pd
+
+from interaction_index import InteractionIndex
+
+
+def drug(name, generic, interactions):
+    return {'drug_name': name, 'generic_name': generic, 'drug_interactions': interactions}
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['drug_name', 'generic_name', 'drug_interactions'])
+
+
+def test_find_leaves_the_index_unchanged(dataset):
+    index = InteractionIndex.from_frame(dataset)
+    entries, names = dict(index._entries), set(index._names)
+
+    outside = drug('ZORBITOL', 'zorbitane', "['Fluoxetine may increase the risk of bleeding']")
+    inside = dataset.iloc[0].to_dict()
+    index.find(outside, inside)
+    index.find(inside, drug('FLUOXETINE', 'fluoxetine', "['The risk of bleeding can be increased']"))
+
+    assert index._entries == entries
+    assert index._names == names
+
+
+def test_unknown_names_are_found_by_scanning():
+    index = InteractionIndex.from_frame(frame([('ALPHAZOL', 'alphazole', "['Betamab may increase toxicity']")]))
+    alpha = drug('ALPHAZOL', 'alphazole', "['Betamab may increase toxicity']")
+
+    assert index.find(alpha, drug('BETAMAB', 'betamab', '[]')) == 'Betamab may increase toxicity'
+    assert index.find(alpha, drug('GAMMANOL', 'gammanol', '[]')) is None
+
+
+def test_with_rows_finds_what_a_full_build_finds_and_keeps_the_parent(dataset):
+    head, tail = dataset.iloc[:len(dataset) // 2], dataset.iloc[len(dataset) // 2:]
+    parent = InteractionIndex.from_frame(head)
+    entries = dict(parent._entries)
+
+    grown = parent
+    for start in range(0, len(tail), 5):
+        grown = grown.with_rows(tail.iloc[start:start + 5])
+    full = InteractionIndex.from_frame(dataset)
+
+    assert parent._entries == entries and parent._recent == {}
+    # Shares the names and matcher instead of rebuilding them per insert
+    assert grown._matcher is parent._matcher
+    records = dataset.iloc[::max(1, len(dataset) // 40)].to_dict('records') + tail.iloc[:10].to_dict('records')
+    for a in records:
+        for b in records:
+            assert grown.find(a, b) == full.find(a, b)
+
+
+def test_with_rows_folds_its_overlay_into_the_entries():
+    lists = [f"['Drug{i} may increase toxicity']" for i in range(200)]
+    rows = frame([(f"DRUG{i}", f"generic{i}", data) for i, data in enumerate(lists)])
+    index = InteractionIndex.from_frame(rows.iloc[:10])
+
+    for i in range(10, 200):
+        index = index.with_rows(rows.iloc[i:i + 1])
+        assert len(index._recent) <= max(64, len(index._entries) // 8)
+
+    assert len(index._entries) + len(index._recent) == 200
+    drug = {'drug_name': 'DRUG5', 'generic_name': 'generic5', 'drug_interactions': '[]'}
+    assert index.find(rows.iloc[150].to_dict(), drug) is None
+    assert index.find(rows.iloc[5].to_dict(), rows.iloc[150].to_dict()) is None
+    assert index.find(rows.iloc[150].to_dict(), {**drug, 'drug_name': 'DRUG150'}) == 'Drug150 may increase toxicity'
+
+
+def test_concurrent_finds_while_rows_are_added(dataset):
+    records = dataset.iloc[:30].to_dict('records')
+    index = InteractionIndex.from_frame(dataset.iloc[:30])
+    expected = {(i, j): index.find(a, b) for i, a in enumerate(records) for j, b in enumerate(records)}
+    errors, done = [], threading.Event()
+
+    def reader():
+        try:
+            while not done.is_set():
+                for (i, j), description in expected.items():
+                    assert index.find(records[i], records[j]) == description
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    grown = index
+    for start in range(30, min(len(dataset), 330), 30):
+        grown = grown.with_rows(dataset.iloc[start:start + 30])
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import app as recommender
+from interaction_tier import InteractionTier
+
+DESCRIPTION = 'Zorbitol may increase the risk of bleeding when combined with Quellamab.'
+
+
+@pytest.fixture
+def confident_tier(monkeypatch):
+    """A fast tier that answers 'high risk' to everything with full confidence."""
+    tier = InteractionTier(np.zeros(1 << 18), 20.0, recommender.CANDIDATE_LABELS)
+    monkeypatch.setattr(recommender, 'interaction_tier', tier)
+    return tier
+
+
+def test_agreement_is_counted_once_per_description(confident_tier):
+    recommender.verdict_cache.put_many({DESCRIPTION: ('low risk', 0.9)})
+
+    for _ in range(3):
+        recommender.classify_interactions([DESCRIPTION, DESCRIPTION])
+
+    assert (confident_tier.compared, confident_tier.agreed) == (1, 0)
+
+
+def test_fast_tier_answers_without_the_zero_shot_model(confident_tier, monkeypatch):
+    monkeypatch.setattr(recommender, '_nlp_classifier', None)
+    monkeypatch.setattr(recommender, '_nlp_state', 'failed')
+    zorbitol = {'drug_name': 'ZORBITOL', 'generic_name': 'zorbitane', 'drug_interactions': f"['{DESCRIPTION}']"}
+    quellamab = {'drug_name': 'QUELLAMAB', 'generic_name': 'quellamab', 'drug_interactions': '[]'}
+
+    assert recommender.score_interaction_risks([(zorbitol, quellamab)]) == [2]
+    assert recommender.check_interaction_nlp(zorbitol, quellamab) == (2, DESCRIPTION)
+
+
+def test_no_verdict_without_tier_or_model(monkeypatch):
+    monkeypatch.setattr(recommender, 'interaction_tier', None)
+    monkeypatch.setattr(recommender, '_nlp_classifier', None)
+    monkeypatch.setattr(recommender, '_nlp_state', 'failed')
+
+    assert recommender.classify_interactions([DESCRIPTION]) == {}
+    assert recommender.classify_interaction(DESCRIPTION) is None
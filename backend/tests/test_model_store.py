@@ -0,0 +1,37 @@
+import json
+import os
+
+import app as recommender
+from model_store import artifact_path, dataset_fingerprint, load_artifact, load_or_build_model
+
+
+def test_warm_start_loads_the_saved_artifact(dataset, tmp_path):
+    booster, metadata = load_or_build_model(dataset, str(tmp_path))
+
+    assert metadata['nlp_status'] == 'ready'
+    loaded = load_artifact(dataset_fingerprint(dataset), str(tmp_path))
+    assert loaded is not None
+    assert loaded[1]['fingerprint'] == metadata['fingerprint']
+
+
+def test_models_trained_without_nlp_are_not_saved(dataset, tmp_path, monkeypatch):
+    monkeypatch.setattr(recommender, '_nlp_classifier', None)
+    monkeypatch.setattr(recommender, '_nlp_state', 'failed')
+    monkeypatch.setattr(recommender, 'interaction_tier', None)
+
+    booster, metadata = load_or_build_model(dataset, str(tmp_path))
+
+    assert booster is not None and metadata['nlp_status'] == 'degraded'
+    assert not os.path.exists(artifact_path(metadata['fingerprint'], str(tmp_path)))
+
+
+def test_degraded_artifacts_are_not_loaded(dataset, tmp_path):
+    fingerprint = dataset_fingerprint(dataset)
+    load_or_build_model(dataset, str(tmp_path))
+    path = os.path.join(artifact_path(fingerprint, str(tmp_path)), 'metadata.json')
+    with open(path) as f:
+        metadata = json.load(f)
+    with open(path, 'w') as f:
+        json.dump({**metadata, 'nlp_status': 'degraded'}, f)
+
+    assert load_artifact(fingerprint, str(tmp_path)) is None
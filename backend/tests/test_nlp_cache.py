@@ -0,0 +1,54 @@
+import sqlite3
+
+from nlp_cache import VerdictCache
+
+
+def open_cache(tmp_path, **kwargs):
+    return VerdictCache("model", ["high risk", "low risk"], path=str(tmp_path / "verdicts.sqlite3"), **kwargs)
+
+
+def disk_rows(cache):
+    with sqlite3.connect(cache.path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+
+def test_verdicts_survive_a_restart(tmp_path):
+    open_cache(tmp_path).put_many({"a": ("high risk", 0.9), "b": "low risk"})
+
+    cache = open_cache(tmp_path)
+
+    assert cache.get_many(["a", "b", "c"]) == {"a": "high risk", "b": "low risk"}
+    assert (cache.disk_hits, cache.misses) == (2, 1)
+
+
+def test_changed_labels_invalidate_the_store(tmp_path):
+    open_cache(tmp_path).put("a", "high risk")
+
+    relabeled = VerdictCache("model", ["risky", "safe"], path=str(tmp_path / "verdicts.sqlite3"))
+
+    assert relabeled.get("a") is None
+
+
+def test_disk_is_trimmed_without_counting_on_every_write(tmp_path):
+    cache = open_cache(tmp_path, memory_size=4, disk_size=100)
+    counts = []
+    cache._conn.set_trace_callback(lambda sql: counts.append(sql) if "COUNT(*)" in sql else None)
+
+    for i in range(250):
+        cache.put_many({f"text {i}": "low risk"})
+        assert disk_rows(cache) <= 100
+
+    assert 0 < len(counts) < 20
+    # The least recently used verdicts went first
+    assert cache.get("text 249") == "low risk"
+    assert cache.get_many(["text 0"]) == {}
+
+
+def test_reopened_cache_keeps_its_bound(tmp_path):
+    cache = open_cache(tmp_path, disk_size=50)
+    cache.put_many({f"text {i}": "low risk" for i in range(40)})
+
+    reopened = open_cache(tmp_path, disk_size=50)
+    reopened.put_many({f"more {i}": "low risk" for i in range(20)})
+
+    assert disk_rows(reopened) <= 50
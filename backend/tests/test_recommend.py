@@ -0,0 +1,27 @@
+import app as recommender
+
+
+def drug(name, cost=1.0):
+    return {'drug_name': name, 'pmpm_cost': cost}
+
+
+def test_regimen_slots_keep_the_first_record_of_each_name_in_order():
+    a1, b1, b2, a2, c1 = drug('A', 1), drug('B', 2), drug('B', 3), drug('A', 4), drug('C', 5)
+
+    assert recommender.regimen_slots([a1, b1, b2, a2]) == [a1, b1]
+    assert recommender.regimen_slots([b1, a1, c1, a2]) == [b1, a1, c1]
+    assert recommender.regimen_slots([a1, a2]) == [a1, a2]
+
+
+def test_recommendations_line_up_with_the_drugs_they_replace(client, server_state):
+    df = server_state.snapshots.current.df
+    assert (df['drug_name'].isin(['PROZAC', 'PREDNISONE'])).sum() > 2
+
+    body = client.post('/api/recommend', json={'drug_names': ['PROZAC', 'PREDNISONE']}).get_json()
+
+    originals, recommended = body['original_drugs'], body['recommended_drugs']
+    assert sorted(drug['drug_name'] for drug in originals) == ['PREDNISONE', 'PROZAC']
+    assert len(recommended) == len(originals)
+    for original, replacement in zip(originals, recommended):
+        assert replacement['therapeutic_class'] == original['therapeutic_class']
+    assert body['analysis']['type'] == 'combination'
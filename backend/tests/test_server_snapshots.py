@@ -0,0 +1,128 @@
+import threading
+
+import numpy as np
+import pytest
+
+from aggregates import AggregateStore
+from drug_catalog import DrugCatalog
+from interaction_index import _entry_key
+from conftest import drug_row
+
+
+def assert_consistent(server):
+    snapshot = server.snapshots.current
+    assert len(server.drug_store) == len(snapshot.df) == len(snapshot.catalog)
+    assert snapshot.aggregates.drug_stats()['total_drugs'] == len(snapshot.df)
+
+
+def test_failed_insert_keeps_store_and_snapshot_in_step(server_state, client, monkeypatch):
+    version = server_state.snapshots.current.version
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("catalog update failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(DrugCatalog, 'with_rows', fail)
+        assert client.post('/api/add-drug', json=drug_row('BROKENOL')).status_code == 500
+
+    assert server_state.snapshots.current.version == version
+    assert_consistent(server_state)
+
+    response = client.post('/api/add-drug', json=drug_row('WORKINGOL'))
+    assert response.status_code == 200
+    assert int(response.headers['X-Snapshot-Version']) == version + 1
+    assert_consistent(server_state)
+    assert client.get('/api/search?q=workingol').get_json()['results'][0]['drug_name'] == 'WORKINGOL'
+
+
+def test_inserts_after_a_late_failure_succeed(server_state, client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("aggregates update failed")
+
+    # Fails after the catalog for the new rows has been built
+    with monkeypatch.context() as patch:
+        patch.setattr(AggregateStore, 'with_rows', fail)
+        assert client.post('/api/add-drug', json=drug_row('BROKENOL', generic_name='BROKENOL')).status_code == 500
+
+    for name in ('BROKENOL', 'WORKINGOL'):
+        assert client.post('/api/add-drug', json=drug_row(name, generic_name=name)).status_code == 200
+    assert_consistent(server_state)
+    catalog = server_state.snapshots.current.catalog
+    assert list(catalog.values('generic_name', np.arange(len(catalog) - 2, len(catalog)))) == ['BROKENOL', 'WORKINGOL']
+
+
+def test_interaction_index_is_published_with_the_snapshot(server_state, client, monkeypatch):
+    import app as recommender
+
+    loaded = recommender.interaction_index
+    before = server_state.snapshots.current
+    target = before.df.iloc[0].to_dict()
+    row = drug_row('LINKAZOL', drug_interactions=f"['{target['drug_name']} may increase the risk of bleeding']")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(AggregateStore, 'with_rows', lambda *args, **kwargs: 1 / 0)
+        assert client.post('/api/add-drug', json=row).status_code == 500
+    assert server_state.snapshots.current.interactions is before.interactions
+
+    assert client.post('/api/add-drug', json=row).status_code == 200
+    after = server_state.snapshots.current
+    linkazol = after.df.iloc[-1].to_dict()
+    assert after.interactions.find(linkazol, target) == f"{target['drug_name']} may increase the risk of bleeding"
+    # Requests still on the old snapshot keep its index, and the loaded one is never replaced
+    key = _entry_key(row['drug_interactions'])
+    assert before.interactions._lookup(key) is None and after.interactions._lookup(key) is not None
+    assert recommender.interaction_index is loaded
+
+
+def test_reads_during_inserts_see_whole_snapshots(server_state, client):
+    df = server_state.snapshots.current.df
+    names = [str(name) for name in df['drug_name'].unique()[:12]]
+    errors = []
+    done = threading.Event()
+
+    def reader(offset):
+        reader_client = server_state.app.test_client()
+        i = offset
+        while not done.is_set():
+            pair = [names[i % len(names)], names[(i + 5) % len(names)]]
+            for response in (
+                reader_client.post('/api/recommend', json={'drug_names': pair}),
+                reader_client.post('/api/recommend', json={'drug_names': pair[:1]}),
+                reader_client.get(f"/api/search?q={pair[0][:4]}"),
+                reader_client.get('/api/drug-stats'),
+            ):
+                if response.status_code >= 500:
+                    errors.append(response.get_json())
+            i += 1
+
+    threads = [threading.Thread(target=reader, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for i in range(8):
+            # Each insert mentions existing drugs, so it reaches the interaction index too
+            row = drug_row(f"CONCURRENTOL {i}", drug_interactions=f"['{names[i]} may increase the risk or severity']")
+            assert client.post('/api/add-drug', json=row).status_code == 200
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    assert_consistent(server_state)
+
+
+def test_recommend_resolves_misspelled_names(client):
+    response = client.post('/api/recommend', json={'drug_names': ['prozak']})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['resolved_names'] == {'PROZAK': 'PROZAC'}
+    assert {drug['drug_name'] for drug in body['original_drugs']} == {'PROZAC'}
+
+
+@pytest.mark.parametrize("query", ["", "zzzzzz"])
+def test_search_without_matches_is_empty(client, query):
+    response = client.get('/api/search', query_string={'q': query})
+    assert response.status_code == 200
+    assert response.get_json()['results'] == []
@@ -0,0 +1,36 @@
+import pandas as pd
+
+import app as recommender
+from synthetic_formulary import generate_formulary, write_formulary
+from conftest import DATASET_PATH
+
+
+def test_same_seed_same_rows():
+    pd.testing.assert_frame_equal(generate_formulary(500, seed=3), generate_formulary(500, seed=3))
+    assert not generate_formulary(500, seed=3).equals(generate_formulary(500, seed=4))
+
+
+def test_csv_loads_like_the_sample(tmp_path):
+    path = write_formulary(str(tmp_path / "synthetic.csv"), 2000, seed=1)
+
+    df = recommender.load_and_clean_data(path)
+    sample = recommender.load_and_clean_data(DATASET_PATH)
+
+    assert len(df) == 2000
+    assert list(df.columns) == list(sample.columns)
+    assert df['pmpm_cost'].dtype == sample['pmpm_cost'].dtype
+    assert (df['pmpm_cost'] > 0).all()
+    assert df['ndc'].is_unique
+    assert df['therapeutic_equivalence_code'].isin(['AB', 'NA', 'AA', 'AP', 'AB1', 'AB3', 'BX', 'AT']).all()
+
+
+def test_generics_are_shared_within_a_class_and_named_by_interactions():
+    df = generate_formulary(3000, seed=2)
+
+    assert (df.groupby('generic_name')['therapeutic_class'].nunique() == 1).all()
+    assert df['therapeutic_class'].value_counts().max() > 1
+    generics = {name.lower() for name in df['generic_name']}
+    mentioned = df['drug_interactions'].map(
+        lambda text: any(word.strip('.,').lower() in generics for word in text.split())
+    )
+    assert mentioned.all()
@@ -0,0 +1,118 @@
+import heapq
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import app as recommender
+from batch_recommend import _init_worker
+from columnar_store import write_columnar, load_columnar
+
+
+TRAINING_WORKERS = int(os.environ.get("TRAINING_WORKERS", str(os.cpu_count() or 1)))
+# Below this many training pairs, forking workers costs more than it saves.
+PARALLEL_MIN_PAIRS = int(os.environ.get("TRAINING_PARALLEL_MIN_PAIRS", "50000"))
+
+# Catalog and build settings for the workers. Set in the parent right before
+# the pool is forked, so children share them copy-on-write.
+_worker_state = {}
+
+
+def class_pair_counts(catalog, classes):
+    """
+    Training pairs each class yields: ordered pairs of its members, less the
+    pairs of two rows with the same drug name (a drug with itself included).
+    """
+    names = catalog.codes['drug_name']
+    counts = []
+    for _, members in classes:
+        _, name_counts = np.unique(names[members], return_counts=True)
+        counts.append(len(members) ** 2 - int((name_counts.astype(np.int64) ** 2).sum()))
+    return counts
+
+
+def balance_shards(weights, n_shards):
+    """
+    Longest-processing-time assignment: items by descending weight, each to the
+    currently lightest shard. Returns the item indices of every non-empty shard,
+    each in ascending order.
+    """
+    shards = [[] for _ in range(n_shards)]
+    heap = [(0, shard) for shard in range(n_shards)]
+    for item in sorted(range(len(weights)), key=lambda i: weights[i], reverse=True):
+        load, shard = heapq.heappop(heap)
+        shards[shard].append(item)
+        heapq.heappush(heap, (load + weights[item], shard))
+    return [sorted(items) for items in shards if items]
+
+
+def _build_shard(task):
+    """Worker: builds the training rows of a shard's classes and writes them as a columnar directory."""
+    shard_id, class_ids = task
+    state = _worker_state
+    classes = [state['classes'][i] for i in class_ids]
+    chunks = [
+        recommender.build_training_chunk(state['catalog'], a_positions, b_positions, state['batch_size'])
+        for a_positions, b_positions in recommender.iter_training_pairs(state['catalog'], state['chunk_size'], classes)
+    ]
+    out_dir = os.path.join(state['out_dir'], f"shard-{shard_id:03d}")
+    if chunks:
+        write_columnar(pd.concat(chunks, ignore_index=True), out_dir, source=f"training shard {shard_id}")
+    # Verdicts this worker computed, so the parent's cache doesn't have to redo them.
+    return out_dir if chunks else None, recommender.verdict_cache.memory_entries()
+
+
+def build_sharded(catalog, batch_size, chunk_size, workers=None):
+    """
+    Builds the training set with its therapeutic classes sharded over a forked
+    process pool; pairs never cross classes, so shards are independent. Shards
+    are balanced by pair count, written as columnar directories and concatenated
+    back in class order, giving the same rows as the sequential build.
+
+    Returns None when sharding doesn't pay off (one worker, few pairs or classes,
+    or no fork), so the caller builds in-process instead.
+    """
+    workers = TRAINING_WORKERS if workers is None else workers
+    classes = list(catalog.classes())
+    counts = class_pair_counts(catalog, classes)
+    can_fork = 'fork' in multiprocessing.get_all_start_methods()
+    if workers <= 1 or len(classes) < 2 or sum(counts) < PARALLEL_MIN_PAIRS or not can_fork:
+        return None
+
+    shards = balance_shards(counts, min(workers, len(classes)))
+    print(f"  - Building {sum(counts)} training pairs from {len(classes)} classes in {len(shards)} shards "
+          f"(largest {max(sum(counts[i] for i in shard) for shard in shards)} pairs).")
+
+    # Load the NLP model before forking so the workers share one copy.
+    recommender.get_nlp_classifier()
+    out_dir = tempfile.mkdtemp(prefix="pbm-training-")
+    try:
+        _worker_state.update(catalog=catalog, classes=classes, batch_size=batch_size,
+                             chunk_size=chunk_size, out_dir=out_dir)
+        context = multiprocessing.get_context('fork')
+        with context.Pool(len(shards), initializer=_init_worker) as pool:
+            results = pool.map(_build_shard, list(enumerate(shards)), chunksize=1)
+
+        # Each shard holds its classes' rows class after class. Concatenate the shards,
+        # then move every class's rows back to where the sequential build puts them.
+        counts = np.asarray(counts, dtype=np.int64)
+        shard_start = np.zeros(len(classes), dtype=np.int64)  # row where a class starts in the shards
+        frames, rows = [], 0
+        for class_ids, (shard_dir, cache_entries) in zip(shards, results):
+            recommender.verdict_cache.merge_memory_entries(cache_entries)
+            shard_start[class_ids] = rows + np.concatenate([[0], np.cumsum(counts[class_ids])[:-1]])
+            if shard_dir is not None:
+                frames.append(load_columnar(shard_dir))
+                rows += len(frames[-1])
+        if not frames:
+            return None
+
+        class_start = np.concatenate([[0], np.cumsum(counts)[:-1]])  # row where a class starts in class order
+        order = np.arange(rows) + np.repeat(shard_start - class_start, counts)
+        return pd.concat(frames, ignore_index=True).iloc[order].reset_index(drop=True)
+    finally:
+        _worker_state.clear()
+        shutil.rmtree(out_dir, ignore_errors=True)
@@ -31,6 +31,24 @@ export interface DrugStats {
   te_codes_distribution: Record<string, number>;
 }
 
+export interface DrugQuery {
+  limit?: number;
+  cursor?: string;
+  fields?: (keyof Drug)[];
+  therapeuticClass?: string;
+  state?: string;
+  teCode?: string;
+}
+
+export interface DrugSearchResult
+  extends Pick<Drug, 'ndc' | 'drug_name' | 'generic_name' | 'therapeutic_class' | 'therapeutic_equivalence_code' | 'pmpm_cost'> {
+  match: {
+    field: 'drug_name' | 'generic_name' | 'ndc';
+    value: string;
+    score: number;
+  };
+}
+
 export interface RecommendationRequest {
   drug_names: string[];
 }
@@ -38,8 +56,9 @@ export interface RecommendationRequest {
 export interface RecommendationResponse {
   original_drugs: Drug[];
   recommended_drugs: Drug[];
+  resolved_names?: Record<string, string>;
   analysis: {
-    type: 'single_drug' | 'combination';
+    type: 'single_drug' | 'combination' | 'regimen';
     cost_saving_per_member?: number;
     total_cost_saving?: number;
     percentage_saving: number;
@@ -48,31 +67,83 @@ export interface RecommendationResponse {
     safety_score?: string;
     therapeutic_class_match?: boolean;
     generic_match?: boolean;
+    alternatives?: Array<{
+      drug_names: string[];
+      predicted_score: number;
+      total_cost_saving: number;
+      interaction_risk: number;
+    }>;
   };
 }
 
+export interface BatchRegimen {
+  drug_names: string[];
+  member_id?: string | number;
+  members?: number;
+}
+
+export interface BatchRecommendationRecord {
+  member_id: string | number | null;
+  members: number;
+  status: 'ok' | 'no_recommendation' | 'not_found' | 'empty';
+  original_drugs: string[];
+  recommended_drugs: string[];
+  original_cost?: number;
+  recommended_cost?: number;
+  saving_per_member: number;
+  monthly_saving: number;
+}
+
+export interface BatchRecommendationSummary {
+  rows: number;
+  unique_regimens: number;
+  rows_with_saving: number;
+  total_monthly_saving: number;
+  total_annual_saving: number;
+}
+
+export interface AddDrugsResponse {
+  message: string;
+  added_count: number;
+  rejected_count: number;
+  invalid_rows: Array<{ row: number; missing_fields: string[] }>;
+  new_training_pairs: number;
+}
+
 export interface CostAnalysis {
   cost_by_therapeutic_class: Record<string, number>;
   pmpm_by_state: Record<string, number>;
   age_distribution: Record<string, number>;
 }
 
+function uploadForm(file: File) {
+  const form = new FormData();
+  form.append('file', file);
+  return form;
+}
+
 class ApiService {
-  private async request<T>(endpoint: string, options?: RequestInit): Promise<T> {
-    try {
-      const response = await fetch(`${API_BASE_URL}${endpoint}`, {
-        headers: {
-          'Content-Type': 'application/json',
-          ...options?.headers,
-        },
-        ...options,
-      });
+  // Uploads go out as multipart forms; the browser sets their Content-Type
+  private async send(endpoint: string, options?: RequestInit) {
+    const isForm = options?.body instanceof FormData;
+    const response = await fetch(`${API_BASE_URL}${endpoint}`, {
+      ...options,
+      headers: {
+        ...(isForm ? {} : { 'Content-Type': 'application/json' }),
+        ...options?.headers,
+      },
+    });
 
-      if (!response.ok) {
-        const errorData = await response.json().catch(() => ({}));
-        throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
-      }
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+    }
+    return response;
+  }
 
+  private async request<T>(endpoint: string, options?: RequestInit): Promise<T> {
+    try {
+      const response = await this.send(endpoint, options);
       return await response.json();
     } catch (error) {
       console.error(`API request failed for ${endpoint}:`, error);
@@ -82,21 +153,37 @@ class ApiService {
 
   async healthCheck() {
     return this.request<{
-      status: string;
+      status: 'loading' | 'ready' | 'degraded';
+      model_status: string;
+      nlp_status: 'idle' | 'loading' | 'ready' | 'degraded';
       model_loaded: boolean;
       data_loaded: boolean;
       nlp_available: boolean;
     }>('/health');
   }
 
-  async getDrugs() {
-    return this.request<{ drugs: Drug[]; total_count: number }>('/drugs');
+  async getDrugs(params?: DrugQuery) {
+    const query = new URLSearchParams();
+    if (params?.limit !== undefined) query.set('limit', String(params.limit));
+    if (params?.cursor) query.set('cursor', params.cursor);
+    if (params?.fields?.length) query.set('fields', params.fields.join(','));
+    if (params?.therapeuticClass) query.set('therapeutic_class', params.therapeuticClass);
+    if (params?.state) query.set('state', params.state);
+    if (params?.teCode) query.set('te_code', params.teCode);
+    const suffix = query.toString() ? `?${query}` : '';
+    return this.request<{ drugs: Drug[]; total_count: number; next_cursor: string | null }>(`/drugs${suffix}`);
   }
 
   async getDrugStats() {
     return this.request<DrugStats>('/drug-stats');
   }
 
+  async searchDrugs(query: string, limit?: number) {
+    const params = new URLSearchParams({ q: query });
+    if (limit !== undefined) params.set('limit', String(limit));
+    return this.request<{ query: string; results: DrugSearchResult[] }>(`/search?${params}`);
+  }
+
   async getRecommendations(drugNames: string[]) {
     return this.request<RecommendationResponse>('/recommend', {
       method: 'POST',
@@ -104,6 +191,45 @@ class ApiService {
     });
   }
 
+  // Regimens as JSON or a claims CSV. Results stream back as NDJSON; onRecord sees each row as it is scored.
+  async getBatchRecommendations(
+    regimens: BatchRegimen[] | File,
+    onRecord?: (record: BatchRecommendationRecord) => void,
+  ) {
+    const records: BatchRecommendationRecord[] = [];
+    let summary: BatchRecommendationSummary | undefined;
+    try {
+      const response = await this.send('/recommend/batch', {
+        method: 'POST',
+        body: regimens instanceof File ? uploadForm(regimens) : JSON.stringify({ regimens }),
+      });
+      const reader = response.body!.pipeThrough(new TextDecoderStream()).getReader();
+      let buffered = '';
+      const consume = (line: string) => {
+        if (!line.trim()) return;
+        const parsed = JSON.parse(line);
+        if ('summary' in parsed) {
+          summary = parsed.summary;
+        } else {
+          records.push(parsed);
+          onRecord?.(parsed);
+        }
+      };
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        const lines = (buffered + value).split('\n');
+        buffered = lines.pop() ?? '';
+        lines.forEach(consume);
+      }
+      consume(buffered);
+    } catch (error) {
+      console.error('API request failed for /recommend/batch:', error);
+      throw error;
+    }
+    return { records, summary };
+  }
+
   async getTherapeuticClasses() {
     return this.request<{
       therapeutic_classes: Array<{ name: string; count: number }>;
@@ -120,6 +246,14 @@ class ApiService {
       body: JSON.stringify(drugData),
     });
   }
+
+  // Not available under multi-process serving (prefork.py answers 409)
+  async addDrugs(drugs: Partial<Drug>[] | File) {
+    return this.request<AddDrugsResponse>('/add-drugs', {
+      method: 'POST',
+      body: drugs instanceof File ? uploadForm(drugs) : JSON.stringify({ drugs }),
+    });
+  }
 }
 
 export const apiService = new ApiService();
\ No newline at end of file